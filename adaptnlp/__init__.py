@@ -5,35 +5,73 @@ from pathlib import Path
 # global variable like Flair's cache_root
 cache_root = Path.home()/".adaptnlp"
 
-# Inference modules
-from .inference.embeddings import (
-    EasyWordEmbeddings,
-    EasyStackedEmbeddings,
-    EasyDocumentEmbeddings
-)
+import importlib
 
-from .inference.sequence_classification import (
-    EasySequenceClassifier,
-    TransformersSequenceClassifier,
-    FlairSequenceClassifier
-)
+# Every public object and the submodule it lives in. Submodules pull in torch, flair, fastai and transformers,
+# so they are only imported on first access through `__getattr__`, keeping `import adaptnlp` cheap
+_lazy_imports = {
+    # Inference modules
+    "EasyWordEmbeddings": ".inference.embeddings",
+    "EasyStackedEmbeddings": ".inference.embeddings",
+    "EasyDocumentEmbeddings": ".inference.embeddings",
+    "EasySequenceClassifier": ".inference.sequence_classification",
+    "TransformersSequenceClassifier": ".inference.sequence_classification",
+    "FlairSequenceClassifier": ".inference.sequence_classification",
+    "EasyTokenTagger": ".inference.token_classification",
+    "EasyQuestionAnswering": ".inference.question_answering",
+    "TransformersQuestionAnswering": ".inference.question_answering",
+    "EasySummarizer": ".inference.summarization",
+    "TransformersSummarizer": ".inference.summarization",
+    "EasyTranslator": ".inference.translation",
+    "TransformersTranslator": ".inference.translation",
+    "EasyTextGenerator": ".inference.text_generation",
+    "TransformersTextGenerator": ".inference.text_generation",
 
-from .inference.token_classification import EasyTokenTagger
-from .inference.question_answering import EasyQuestionAnswering, TransformersQuestionAnswering
-from .inference.summarization import EasySummarizer, TransformersSummarizer
-from .inference.translation import EasyTranslator, TransformersTranslator
-from .inference.text_generation import EasyTextGenerator, TransformersTextGenerator
+    "DetailLevel": ".result",
+    "InferenceEngine": ".model",
+    "Quantization": ".model",
+    "MicroBatcher": ".model",
+    "stream_predict": ".model",
+    "compare_models": ".model",
 
-from .result import DetailLevel
+    # Huggingface Hub bits
+    "HFModelHub": ".model_hub",
+    "FlairModelHub": ".model_hub",
+    "HF_TASKS": ".model_hub",
+    "FLAIR_TASKS": ".model_hub",
 
-# Huggingface Hub bits
-from .model_hub import HFModelHub, FlairModelHub, HF_TASKS, FLAIR_TASKS
+    # Training API
+    "Strategy": ".training.core",
+    "TaskDatasets": ".training.core",
+    "AdaptiveTuner": ".training.core",
+    "AdaptiveDataLoaders": ".training.core",
+    "SequenceClassificationTuner": ".training.sequence_classification",
+    "SequenceClassificationDatasets": ".training.sequence_classification",
+    "LanguageModelTuner": ".training.language_model",
+    "LanguageModelDatasets": ".training.language_model",
+    "NERMetric": ".training.token_classification",
+    "TokenClassificationDatasets": ".training.token_classification",
+    "TokenClassificationTuner": ".training.token_classification",
+}
 
-# Training API
-from .training.core import Strategy, TaskDatasets, AdaptiveTuner, AdaptiveDataLoaders
-from .training.sequence_classification import SequenceClassificationTuner, SequenceClassificationDatasets
-from .training.language_model import LanguageModelTuner, LanguageModelDatasets
-from .training.token_classification import NERMetric, TokenClassificationDatasets, TokenClassificationTuner
+_submodules = ("callback", "file_utils", "inference", "model", "model_hub", "result", "training")
+
+
+def __getattr__(name):
+    "Imports the submodule holding `name` on first access"
+    if name in _lazy_imports:
+        obj = getattr(importlib.import_module(_lazy_imports[name], __name__), name)
+    elif name in _submodules:
+        obj = importlib.import_module(f".{name}", __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    # Later lookups find it directly, without going through `__getattr__`
+    globals()[name] = obj
+    return obj
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_imports) | set(_submodules))
 
 
 __all__ = [
@@ -54,6 +92,11 @@ __all__ = [
     "EasyTextGenerator",
     "TransformersTextGenerator",
     "DetailLevel",
+    "InferenceEngine",
+    "Quantization",
+    "MicroBatcher",
+    "stream_predict",
+    "compare_models",
     "HFModelHub",
     "FlairModelHub",
     "HF_TASKS",
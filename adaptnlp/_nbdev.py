@@ -11,10 +11,16 @@ index = {"SentenceResult": "00_result.ipynb",
          "FLAIR_MODELS": "02_model_hub.ipynb",
          "FlairModelResult": "02_model_hub.ipynb",
          "FlairModelHub": "02_model_hub.ipynb",
+         "InferenceEngine": "03_model.ipynb",
+         "Quantization": "03_model.ipynb",
          "DataLoader.one_batch": "03_model.ipynb",
          "GatherPredsCallback.after_validate": "03_model.ipynb",
          "CudaCallback": "03_model.ipynb",
+         "BucketedDataLoader": "03_model.ipynb",
          "AdaptiveModel": "03_model.ipynb",
+         "MicroBatcher": "03_model.ipynb",
+         "stream_predict": "03_model.ipynb",
+         "compare_models": "03_model.ipynb",
          "logger": "11_inference.utils.ipynb",
          "EmbeddingResult": "04_embeddings.ipynb",
          "EasyWordEmbeddings": "04_embeddings.ipynb",
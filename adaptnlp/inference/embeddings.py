@@ -4,7 +4,8 @@ __all__ = ['logger', 'EmbeddingResult', 'EasyWordEmbeddings', 'EasyStackedEmbedd
 
 # Cell
 import logging, torch
-from typing import List, Dict, Union
+from typing import List, Dict, Union, Iterable, Iterator
+from functools import partial
 from fastcore.basics import listify
 from collections import defaultdict, OrderedDict
 
@@ -22,14 +23,11 @@ from flair.embeddings import (
     TransformerWordEmbeddings,
 )
 
-from ..model_hub import FlairModelResult, HFModelResult, HFModelHub, FlairModelHub
+from ..model import stream_predict
+from ..model_hub import FlairModelResult, HFModelResult, _resolver
 
 from ..result import SentenceResult, DetailLevel
 
-# Cell
-_flair_hub = FlairModelHub()
-_hf_hub = HFModelHub()
-
 # Cell
 logger = logging.getLogger(__name__)
 
@@ -56,32 +54,23 @@ def _make_sentences(text:Sentence, as_list=False) -> Union[List[Sentence], Sente
 def _get_embedding_model(model_name_or_path:HFModelResult) -> TransformerWordEmbeddings:
     return TransformerWordEmbeddings(model_name_or_path.name)
 
+# Internal Cell
+def _resolve_embedding_model(model_name_or_path:Union[str, FlairModelResult]) -> Union[TransformerWordEmbeddings, WordEmbeddings, FlairEmbeddings]:
+    model = _resolver.load('embeddings', model_name_or_path,
+                           flair=[WordEmbeddings, FlairEmbeddings], hf=[TransformerWordEmbeddings])
+    if model is None:
+        raise ValueError(f'Embeddings not found for the model key: {model_name_or_path}, check documentation or custom model path to verify specified model')
+    return model
+
 # Internal Cell
 @typedispatch
 def _get_embedding_model(model_name_or_path:FlairModelResult) -> Union[FlairEmbeddings, WordEmbeddings]:
-    nm = model_name_or_path.name
-    try:
-        return WordEmbeddings(nm.strip('flairNLP/'))
-    except:
-        return FlairEmbeddings(nm.strip('flairNLP/'))
+    return _resolve_embedding_model(model_name_or_path)
 
 # Internal Cell
 @typedispatch
 def _get_embedding_model(model_name_or_path:str) -> Union[TransformerWordEmbeddings, WordEmbeddings, FlairEmbeddings]:
-    res = _flair_hub.search_model_by_name(model_name_or_path, user_uploaded=True)
-    if len(res) < 1:
-        # No models found
-        res = _hf_hub.search_model_by_name(model_name_or_path, user_uploaded=True)
-        if len(res) < 1:
-            raise ValueError(f'Embeddings not found for the model key: {model_name_or_path}, check documentation or custom model path to verify specified model')
-        else:
-            return TransformerWordEmbeddings(res[0].name) # Returning the first should always be the non-fast option
-    else:
-        nm = res[0].name
-        try:
-            return WordEmbeddings(nm.strip('flairNLP/'))
-        except:
-            return FlairEmbeddings(nm.strip('flairNLP/'))
+    return _resolve_embedding_model(model_name_or_path)
 
 # Cell
 class EmbeddingResult(SentenceResult):
@@ -188,6 +177,16 @@ class EasyWordEmbeddings:
         else:
             return listify(embeds)
 
+    def embed_text_stream(
+        self,
+        text: Iterable[Union[Sentence, str]], # Any iterable of strings or `Sentence`s, such as an open file or a database cursor
+        chunk_size: int = 256, # How many texts are embedded and yielded at a time
+        prefetch: int = 1, # How many chunks are embedded ahead of the one being consumed
+        **kwargs, # Keyword arguments for `embed_text`, such as `model_name_or_path` and `detail_level`
+    ) -> Iterator: # What `embed_text` returns for each chunk of `text`, in order
+        "Lazily runs `embed_text` over `text` one chunk at a time, so inputs larger than memory can be streamed through"
+        return stream_predict(text, partial(self.embed_text, **kwargs), chunk_size=chunk_size, prefetch=prefetch)
+
     def embed_all(
         self,
         text: Union[List[Sentence], Sentence, List[str], str], # Text input, it can be a string or any of Flair's `Sentence` input formats
@@ -3,14 +3,16 @@
 __all__ = ['logger', 'QACallback', 'QAResult', 'TransformersQuestionAnswering', 'EasyQuestionAnswering']
 
 # Cell
-import logging
-from torch import tensor
+import logging, re
 from typing import Tuple, List, Union, Dict
 from collections import OrderedDict, defaultdict
+from functools import partial, lru_cache
 from tqdm import tqdm
 
+import numpy as np
+
 import torch
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, TensorDataset
 from transformers import (
     AutoTokenizer,
     AutoModelForQuestionAnswering,
@@ -28,14 +30,14 @@ from transformers import (
 from transformers.modeling_outputs import QuestionAnsweringModelOutput
 from transformers.data.processors.squad import SquadResult
 
-from ..model import AdaptiveModel, DataLoader
+from ..model import AdaptiveModel, DataLoader, Quantization
 from ..model_hub import HFModelResult
 from .utils import (
     compute_predictions_log_probs,
     compute_predictions_logits,
 )
 
-from fastcore.basics import risinstance, nested_attr, Self, patch, listify
+from fastcore.basics import risinstance, nested_attr, Self, patch, listify, store_attr
 
 from fastai.callback.core import Callback
 from fastai.torch_core import apply, to_detach
@@ -71,12 +73,13 @@ class QACallback(Callback):
                     }
                 )
     def after_pred(self):
-        "Generate SquadResults"
+        "Generate a `SquadResult` for each feature in the batch"
+        outputs = apply(Self.numpy(), to_detach(list(self.pred.values()), cpu=True))
+        results = []
         for i, example_index in enumerate(self.example_indices):
             eval_feature = self.features[example_index.item()]
             unique_id = int(eval_feature.unique_id)
-            output = [self.pred[output][i] for output in self.pred]
-            output = apply(Self.numpy(), to_detach(output))
+            output = [o[i] for o in outputs]
 
             if isinstance(self.learn.model, self.xmodel_instances):
                 # Some models like the ones in `self.xmodel_instances` use 5 arguments for their predictions
@@ -86,17 +89,18 @@ class QACallback(Callback):
                 end_top_index = output[3]
                 cls_logits = output[4]
 
-                self.learn.pred = SquadResult(
+                results.append(SquadResult(
                     unique_id,
                     start_logits,
                     end_logits,
                     start_top_index=start_top_index,
                     end_top_index=end_top_index,
                     cls_logits=cls_logits
-                )
+                ))
             else:
                 start_logits, end_logits = output
-                self.learn.pred = SquadResult(unique_id, start_logits, end_logits)
+                results.append(SquadResult(unique_id, start_logits, end_logits))
+        self.learn.pred = results
 
 # Cell
 from ..result import DetailLevel
@@ -104,18 +108,49 @@ from ..result import DetailLevel
 class QAResult:
     """
     A result class designed for Question Answering models
+
+    The answers to every question are kept as flat arrays, and each answer's text is sliced from its context when asked for
     """
     def __init__(
         self,
         examples:List[SquadExample],
         top_predictions:Union[str, OrderedDict],
-        all_nbest_json:List[OrderedDict],
+        all_nbest_json:Dict[str, List[OrderedDict]],
         n_best_size:int
     ):
         self._examples = examples
         self._top_predictions = top_predictions
-        self._all_nbest_json = all_nbest_json
         self.n_best_size = n_best_size
+        self._ids = list(all_nbest_json)
+        self.lengths = np.array([len(o) for o in all_nbest_json.values()], dtype=np.int64) # How many answers each question has
+        self._bounds = np.concatenate([[0], np.cumsum(self.lengths)])
+        entries = [e for o in all_nbest_json.values() for e in o]
+        # Every value but the text becomes a column, such as the probabilities and logits
+        self._keys = [k for k in entries[0] if k != 'text'] if entries else []
+        self._columns = {k:np.array([e[k] for e in entries]) for k in self._keys}
+        self._locate([e['text'] for e in entries])
+
+    def _locate(self, texts:List[str]):
+        "Find where each answer in `texts` sits in its context, keeping only the source and span"
+        cols, sources, self._source = self._columns, {}, np.zeros(len(texts), dtype=np.int64)
+        self._spans = np.zeros((len(texts), 2), dtype=np.int64)
+        for q, example in enumerate(self._examples):
+            lo, hi = self._bounds[q:q+2]
+            # Start looking at the first character of each answer's first word
+            hints = np.zeros(hi - lo, dtype=np.int64)
+            if 'start_char' in cols: hints = cols['start_char'][lo:hi]
+            elif 'start_index' in cols and example.char_to_word_offset is not None:
+                hints = np.searchsorted(np.asarray(example.char_to_word_offset), cols['start_index'][lo:hi])
+            for i, hint in zip(range(lo, hi), hints.tolist()):
+                context, text = example.context_text, texts[i]
+                if isinstance(context, list): context = context[int(cols['context_index'][i])]
+                start = context.find(text, hint)
+                if start < 0: start = context.find(text)
+                # Answers that are not part of the context, such as the 'empty' nonce, are their own source
+                if start < 0: context, start = text, 0
+                self._source[i] = sources.setdefault(context, len(sources))
+                self._spans[i] = start, start + len(text)
+        self._sources = list(sources)
 
     @property
     def queries(self) -> List[str]:
@@ -135,36 +170,45 @@ class QAResult:
             return [e.context_text for e in self._examples]
 
     @property
-    def probs(self) -> List[List[tensor]]:
+    def probs(self) -> Union[torch.Tensor, Tuple[torch.Tensor]]:
         """
-        The probabilities returned for each question
+        The probabilities returned for each question, as one row per question when they all have as many answers
         """
-        return torch.stack([tensor([o['probability'] for o in self._all_nbest_json[i]]) for i in self._all_nbest_json], dim=0)
+        if '_probs' not in self.__dict__:
+            probs = torch.tensor(self._columns.get('probability', np.zeros(0)), dtype=torch.float32)
+            if len(set(self.lengths.tolist())) == 1: self._probs = probs.view(len(self.lengths), -1)
+            else: self._probs = probs.split(self.lengths.tolist())
+        return self._probs
 
     @property
     def best_answers(self) -> List[str]:
         """
         The best answer from each question
         """
-        a = []
-        for i in range(len(self._all_nbest_json)):
-            o = OrderedDict()
-            if self.n_best_size > len(self._all_nbest_json[str(i)]):
-                print(f"Warning! `n_best_size` {self.n_best_size} is greater than the actual number of answers {len(self._all_nbest_json[str(i)])}, only returning {len(self._all_nbest_json[str(i)])} answers")
-                rng = len(self._all_nbest_json[str(i)])
-            else:
-                rng = self.n_best_size
-            for j in range(rng):
-                o.update({j:self._all_nbest_json[str(i)][j]['text']})
-            a.append(o)
-        return a
+        if '_best_answers' not in self.__dict__:
+            short = int((self.lengths < self.n_best_size).sum())
+            if short:
+                logger.warning(f'`n_best_size` {self.n_best_size} is greater than the number of answers to {short} of {len(self.lengths)} questions, only returning the answers they have')
+            self._best_answers = [OrderedDict(enumerate(o[:self.n_best_size])) for o in self.all_answers]
+        return self._best_answers
 
     @property
     def all_answers(self) -> List[List[str]]:
         """
         Every answer ordered by probability from each question
         """
-        return tuple([tuple([o['text'] for o in self._all_nbest_json[i]]) for i in self._all_nbest_json])
+        if '_all_answers' not in self.__dict__:
+            texts = [self._sources[i][s:e] for i, (s, e) in zip(self._source.tolist(), self._spans.tolist())]
+            self._all_answers = tuple(tuple(texts[lo:hi]) for lo, hi in zip(self._bounds[:-1], self._bounds[1:]))
+        return self._all_answers
+
+    @property
+    def _all_nbest_json(self) -> Dict[str, List[OrderedDict]]:
+        "The `n_best_json` entries of each question, rebuilt from the arrays"
+        cols = [self._columns[k].tolist() for k in self._keys]
+        texts = [t for o in self.all_answers for t in o]
+        entries = [OrderedDict(text=t, **dict(zip(self._keys, v))) for t, *v in zip(texts, *cols)]
+        return OrderedDict((i, entries[lo:hi]) for i, lo, hi in zip(self._ids, self._bounds[:-1], self._bounds[1:]))
 
     def to_dict(self, detail_level:DetailLevel=DetailLevel.Low):
         """
@@ -187,6 +231,316 @@ class QAResult:
 
         return o
 
+# Internal Cell
+class _QAFeature:
+    """
+    One strided window of an example, with the parts of a `SquadFeatures` that `compute_predictions_logits` reads.
+    The context token maps are kept as arrays and only turned into dictionaries when asked for
+    """
+    def __init__(
+        self,
+        unique_id:int,
+        example_index:int, # Index of the example this window came from
+        tokenizer:PreTrainedTokenizer,
+        token_ids:np.ndarray, # The window's token ids, without padding
+        context_tokens:np.ndarray, # Positions of the context tokens in the window
+        orig_tokens:np.ndarray, # Index of the whitespace separated word of `SquadExample.doc_tokens` each context token is in
+        is_max_context:np.ndarray, # Whether this is the window where each context token has the most context around it
+        offsets:np.ndarray # Start and end character in the context of each token in the window, zero outside the context
+    ):
+        store_attr()
+
+    @property
+    def tokens(self) -> List[str]:
+        if '_tokens' not in self.__dict__: self._tokens = self.tokenizer.convert_ids_to_tokens(self.token_ids.tolist())
+        return self._tokens
+
+    @property
+    def token_to_orig_map(self) -> Dict[int, int]:
+        if '_token_to_orig_map' not in self.__dict__:
+            self._token_to_orig_map = dict(zip(self.context_tokens.tolist(), self.orig_tokens.tolist()))
+        return self._token_to_orig_map
+
+    @property
+    def token_is_max_context(self) -> Dict[int, bool]:
+        if '_token_is_max_context' not in self.__dict__:
+            self._token_is_max_context = dict(zip(self.context_tokens.tolist(), self.is_max_context.tolist()))
+        return self._token_is_max_context
+
+# Internal Cell
+def _fast_squad_features(
+    examples:List[SquadExample],
+    tokenizer:PreTrainedTokenizer, # A fast tokenizer, with the question before the context
+    max_seq_length:int,
+    doc_stride:int, # Number of tokens each window starts after the one before it
+    max_query_length:int
+) -> Tuple[List[_QAFeature], TensorDataset]:
+    """
+    Splits `examples` into strided windows with a fast tokenizer, in place of `squad_convert_examples_to_features`.
+    Returns the features along with a dataset laid out the same way: input ids, attention mask, token type ids and feature index
+    """
+    # Questions are cut to `max_query_length` tokens first, as `squad_convert_examples_to_features` does
+    questions = [e.question_text.lstrip() for e in examples]
+    q_offsets = tokenizer(questions, add_special_tokens=False, truncation=True, max_length=max_query_length,
+                          return_offsets_mapping=True)['offset_mapping']
+    questions = [q[:o[-1][1]] if len(o) else q for q,o in zip(questions, q_offsets)]
+    # The tokenizer's stride is how many tokens windows overlap by, which is whatever room a question leaves for the
+    # context less `doc_stride`, so examples are tokenized together with the others that overlap by as much
+    added = tokenizer.num_special_tokens_to_add(pair=True)
+    by_overlap = defaultdict(list)
+    for i, o in enumerate(q_offsets): by_overlap[max(0, max_seq_length - doc_stride - len(o) - added)].append(i)
+    parts = []
+    for overlap, idxs in by_overlap.items():
+        enc = tokenizer(
+            [questions[i] for i in idxs], [examples[i].context_text for i in idxs],
+            truncation='only_second', max_length=max_seq_length, stride=overlap, padding='longest',
+            return_overflowing_tokens=True, return_offsets_mapping=True, return_tensors='np'
+        )
+        n, sl = enc['input_ids'].shape
+        is_context = np.array([[s == 1 for s in enc.sequence_ids(i)] for i in range(n)], dtype=bool).reshape(n, sl)
+        token_type_ids = enc['token_type_ids'] if 'token_type_ids' in enc else np.zeros_like(enc['input_ids'])
+        parts.append((np.array(idxs)[enc['overflow_to_sample_mapping']], enc['input_ids'], enc['attention_mask'],
+                      token_type_ids, enc['offset_mapping'], is_context))
+    # Groups are padded to the longest of them, and each example's windows put back next to each other
+    sl = max(p[1].shape[1] for p in parts)
+    def _stack(j, value=0):
+        return np.concatenate([np.pad(p[j], [(0, 0), (0, sl - p[j].shape[1])] + [(0, 0)] * (p[j].ndim - 2), constant_values=value)
+                               for p in parts])
+    sample_map = np.concatenate([p[0] for p in parts])
+    by_example = np.argsort(sample_map, kind='stable')
+    sample_map = sample_map[by_example]
+    input_ids, attention_mask, token_type_ids, offsets, is_context = [
+        _stack(j, tokenizer.pad_token_id if j == 1 else 0)[by_example] for j in range(1, 6)
+    ]
+    n = len(sample_map)
+    offsets[~is_context] = 0
+    # Each context token scores its distance to the nearer edge of its window, plus a little for longer windows,
+    # and belongs to the window it scores highest in, or the first of those
+    position = np.cumsum(is_context, axis=1) - 1
+    ctx_len = is_context.sum(axis=1, keepdims=True)
+    score = np.minimum(position, ctx_len - 1 - position) + 0.01 * ctx_len
+    feat_idx, tok_idx = np.nonzero(is_context)
+    ex_idx, starts, ends = sample_map[feat_idx], offsets[feat_idx, tok_idx, 0], offsets[feat_idx, tok_idx, 1]
+    order = np.lexsort((feat_idx, -score[feat_idx, tok_idx], ends, starts, ex_idx))
+    first = np.ones(len(order), dtype=bool)
+    key = np.stack([ex_idx, starts, ends])[:, order]
+    first[1:] = (key[:, 1:] != key[:, :-1]).any(axis=0)
+    is_max = np.empty(len(order), dtype=bool)
+    is_max[order] = first
+    # Character offsets into the context become the word of `doc_tokens` they fall in
+    char_to_word = [np.asarray(e.char_to_word_offset) for e in examples]
+    orig = np.empty(len(feat_idx), dtype=np.int64)
+    for i, c2w in enumerate(char_to_word):
+        m = ex_idx == i
+        orig[m] = c2w[np.minimum(starts[m], len(c2w) - 1)]
+    bounds = np.searchsorted(feat_idx, np.arange(n + 1))
+    lengths = attention_mask.sum(axis=1)
+    features = [
+        _QAFeature(
+            1000000000 + i, int(sample_map[i]), tokenizer, input_ids[i][:lengths[i]],
+            tok_idx[bounds[i]:bounds[i+1]], orig[bounds[i]:bounds[i+1]], is_max[bounds[i]:bounds[i+1]], offsets[i]
+        )
+        for i in range(n)
+    ]
+    dataset = TensorDataset(
+        torch.from_numpy(input_ids).long(),
+        torch.from_numpy(attention_mask).long(),
+        torch.from_numpy(token_type_ids).long(),
+        torch.arange(n, dtype=torch.long)
+    )
+    return features, dataset
+
+# Internal Cell
+_whitespace = '[ \t\r\n\u202f]'
+
+def _split_words(context:str) -> Tuple[List[str], np.ndarray]:
+    "The whitespace separated words of `context`, and which word each character is in, the same as `SquadExample` splits them"
+    is_space = np.isin(np.frombuffer(context.encode('utf-32-le'), dtype=np.uint32), [ord(c) for c in ' \t\r\n\u202f'])
+    word_start = ~is_space & np.concatenate([[True], is_space[:-1]])
+    # Spaces belong to the word before them
+    return [w for w in re.split(_whitespace, context) if w], np.cumsum(word_start) - 1
+
+# Internal Cell
+class _QAExample(SquadExample):
+    "A `SquadExample` whose context was already split into words, such as once for every question asked of it"
+    def __init__(self, qas_id:str, question_text:str, context_text:str, doc_tokens:List[str], char_to_word_offset:np.ndarray):
+        self.qas_id, self.question_text, self.context_text = qas_id, question_text, context_text
+        self.answer_text, self.title, self.is_impossible, self.answers = None, 'qa', False, ['answer']
+        self.doc_tokens, self.char_to_word_offset = doc_tokens, char_to_word_offset
+        self.start_position, self.end_position = 0, 0
+
+# Internal Cell
+class _ContextWindows:
+    """
+    A context split into words and tokenized once, and cut into windows that each start `doc_stride` tokens after the one before.
+    Windows leave room for the longest question allowed, so any question can be spliced in front of them
+    """
+    def __init__(
+        self,
+        tokenizer:PreTrainedTokenizer, # A fast tokenizer
+        context:str,
+        max_seq_length:int,
+        doc_stride:int,
+        max_query_length:int
+    ):
+        self.doc_tokens, self.char_to_word_offset = _split_words(context)
+        enc = tokenizer(context, add_special_tokens=False, return_offsets_mapping=True)
+        ids, offsets = np.array(enc['input_ids'], dtype=np.int64), np.array(enc['offset_mapping'], dtype=np.int64).reshape(-1, 2)
+        length = max_seq_length - max_query_length - tokenizer.num_special_tokens_to_add(pair=True)
+        if length <= 0:
+            raise ValueError(f'`max_query_length` {max_query_length} leaves no room for the context in `max_seq_length` {max_seq_length}')
+        if doc_stride <= 0: raise ValueError(f'`doc_stride` must be positive, but got {doc_stride}')
+        # As `squad_convert_examples_to_features` does for the longest question, a window moves on by at most its own length
+        step = min(doc_stride, length)
+        starts = [0]
+        while starts[-1] + length < len(ids): starts.append(starts[-1] + step)
+        # Each token belongs to the window it has the most context in, or the first of those
+        best_score, best_window = np.full(len(ids), -np.inf), np.zeros(len(ids), dtype=np.int64)
+        for w, start in enumerate(starts):
+            n = min(length, len(ids) - start)
+            pos = np.arange(n)
+            score = np.minimum(pos, n - 1 - pos) + 0.01 * n
+            better = score > best_score[start:start+n]
+            best_score[start:start+n][better], best_window[start:start+n][better] = score[better], w
+        c2w = self.char_to_word_offset
+        orig = c2w[np.minimum(offsets[:, 0], len(c2w) - 1)] if len(ids) else np.zeros(0, dtype=np.int64)
+        spans = [slice(start, start + length) for start in starts]
+        self.ids = [ids[o] for o in spans]
+        self.offsets = [offsets[o] for o in spans]
+        self.orig_tokens = [orig[o] for o in spans]
+        self.is_max_context = [best_window[o] == w for w, o in enumerate(spans)]
+
+# Internal Cell
+def _spliced_squad_features(
+    query:List[str],
+    context:List[str],
+    tokenizer:PreTrainedTokenizer, # A fast tokenizer, with the question before the context
+    windows, # Returns the `_ContextWindows` of a context, such as from a cache
+    max_query_length:int
+) -> Tuple[List[_QAExample], List[_QAFeature], TensorDataset]:
+    """
+    Examples, features and a dataset for `query` and `context` like `_fast_squad_features`, except that each question's tokens
+    are spliced in front of the windows of its context. The windows of each context are kept next to each other
+    """
+    # Each distinct question is tokenized once, and marked with where the context goes among its special tokens
+    questions = list(dict.fromkeys(query))
+    q_ids = tokenizer([q.lstrip() for q in questions], add_special_tokens=False, truncation=True, max_length=max_query_length)['input_ids']
+    templates = {}
+    for q, ids in zip(questions, q_ids):
+        template = np.array(tokenizer.build_inputs_with_special_tokens(ids, [-1]), dtype=np.int64)
+        types = np.array(tokenizer.create_token_type_ids_from_sequences(ids, [-1]), dtype=np.int64)
+        templates[q] = (template, types, int(np.flatnonzero(template == -1)[0]))
+    by_context = defaultdict(list)
+    for i, c in enumerate(context): by_context[c].append(i)
+    examples, rows = [None] * len(query), []
+    for c, idxs in by_context.items():
+        w = windows(c)
+        for i in idxs:
+            examples[i] = _QAExample(str(i), query[i], c, w.doc_tokens, w.char_to_word_offset)
+            ids, types, at = templates[query[i]]
+            for k in range(len(w.ids)):
+                n = len(w.ids[k])
+                rows.append((
+                    i, w, k, at,
+                    np.concatenate([ids[:at], w.ids[k], ids[at+1:]]),
+                    np.concatenate([types[:at], np.full(n, types[at]), types[at+1:]])
+                ))
+    sl = max((len(r[4]) for r in rows), default=0)
+    input_ids = np.full((len(rows), sl), tokenizer.pad_token_id, dtype=np.int64)
+    attention_mask, token_type_ids = np.zeros_like(input_ids), np.zeros_like(input_ids)
+    features = []
+    for f, (i, w, k, at, ids, types) in enumerate(rows):
+        input_ids[f, :len(ids)], attention_mask[f, :len(ids)], token_type_ids[f, :len(ids)] = ids, 1, types
+        n = len(w.ids[k])
+        offsets = np.zeros((sl, 2), dtype=np.int64)
+        offsets[at:at+n] = w.offsets[k]
+        features.append(_QAFeature(1000000000 + f, i, tokenizer, ids, np.arange(at, at + n), w.orig_tokens[k], w.is_max_context[k], offsets))
+    dataset = TensorDataset(
+        torch.from_numpy(input_ids),
+        torch.from_numpy(attention_mask),
+        torch.from_numpy(token_type_ids),
+        torch.arange(len(rows), dtype=torch.long)
+    )
+    return examples, features, dataset
+
+# Internal Cell
+def _global_top_k(
+    features:List[_QAFeature],
+    results:list, # A `SquadResult` for each of `features`
+    groups:List[int], # Which question each feature's example asks
+    n_groups:int, # How many distinct questions there are
+    contexts:List[str], # The context of each example
+    top_k:int,
+    max_answer_length:int,
+    chunk_size:int=64 # How many features to score at once
+) -> List[List[OrderedDict]]:
+    """
+    The `top_k` best spans for each question across every context it was asked of, as `n_best_json` entries.
+
+    Spans are scored like `compute_predictions_logits` does, over every start and the `max_answer_length` ends after it.
+    A feature's best start plus best end logit bounds any span in it, so features are scored in order of that bound,
+    and scoring stops once no remaining feature can make it into the `top_k`
+    """
+    by_id = {r.unique_id:r for r in results}
+    start_logits = np.stack([np.asarray(by_id[f.unique_id].start_logits) for f in features]).astype(np.float64)
+    end_logits = np.stack([np.asarray(by_id[f.unique_id].end_logits) for f in features]).astype(np.float64)
+    n, sl = start_logits.shape
+    # Spans start at a context token in the window where it has the most context, and end at any context token
+    rows = np.concatenate([np.full(len(f.context_tokens), i) for i,f in enumerate(features)]).astype(np.int64)
+    cols = np.concatenate([f.context_tokens for f in features]).astype(np.int64)
+    can_start, can_end = np.zeros((n, sl), dtype=bool), np.zeros((n, sl), dtype=bool)
+    can_start[rows, cols] = np.concatenate([f.is_max_context for f in features])
+    can_end[rows, cols] = True
+    start_logits, end_logits = np.where(can_start, start_logits, -np.inf), np.where(can_end, end_logits, -np.inf)
+    bound = start_logits.max(axis=1) + end_logits.max(axis=1)
+    # The logits of the ends `0..max_answer_length-1` tokens after each start
+    end_logits = np.concatenate([end_logits, np.full((n, max_answer_length - 1), -np.inf)], axis=1)
+    band = np.arange(sl)[:, None] + np.arange(max_answer_length)[None, :]
+    groups = np.asarray(groups)
+    n_best = []
+    for g in range(n_groups):
+        idxs = np.flatnonzero(groups == g)
+        idxs = idxs[np.argsort(-bound[idxs], kind='stable')]
+        scores, spans = np.zeros(0), np.zeros((0, 3), dtype=np.int64)
+        for i in range(0, len(idxs), chunk_size):
+            chunk = idxs[i:i+chunk_size]
+            if len(scores) == top_k: chunk = chunk[bound[chunk] > scores[-1]]
+            # Bounds only go down from here, so nothing later can make it either
+            if not len(chunk): break
+            chunk_scores = (start_logits[chunk][:, :, None] + end_logits[chunk][:, band]).reshape(-1)
+            k = min(top_k, int(np.isfinite(chunk_scores).sum()))
+            if k == 0: continue
+            top = np.argpartition(-chunk_scores, k - 1)[:k]
+            f, start, length = np.unravel_index(top, (len(chunk), sl, max_answer_length))
+            scores = np.concatenate([scores, chunk_scores[top]])
+            spans = np.concatenate([spans, np.stack([chunk[f], start, start + length], axis=1)])
+            order = np.argsort(-scores, kind='stable')[:top_k]
+            scores, spans = scores[order], spans[order]
+        probs = np.exp(scores - scores.max()) if len(scores) else scores
+        probs = probs / probs.sum() if len(scores) else probs
+        nbest_json = []
+        for (f, start, end), prob in zip(spans.tolist(), probs.tolist()):
+            feature, first = features[f], int(features[f].context_tokens[0])
+            start_char, end_char = int(feature.offsets[start, 0]), int(feature.offsets[end, 1])
+            nbest_json.append(OrderedDict(
+                text=contexts[feature.example_index][start_char:end_char],
+                probability=prob,
+                start_logit=float(start_logits[f, start]),
+                end_logit=float(end_logits[f, end]),
+                start_index=int(feature.orig_tokens[start - first]),
+                end_index=int(feature.orig_tokens[end - first]),
+                context_index=feature.example_index,
+                start_char=start_char,
+                end_char=end_char
+            ))
+        # In very rare edge cases there could be no valid spans at all, so a nonce answer avoids failure
+        if not nbest_json:
+            nbest_json.append(OrderedDict(text='empty', probability=1.0, start_logit=0.0, end_logit=0.0,
+                                          start_index=0, end_index=0, context_index=0,
+                                          start_char=0, end_char=0))
+        n_best.append(nbest_json)
+    return n_best
+
 # Cell
 class TransformersQuestionAnswering(AdaptiveModel):
     """Adaptive Model for Transformers Question Answering Model
@@ -197,6 +551,7 @@ class TransformersQuestionAnswering(AdaptiveModel):
     * **model** - A transformer Question Answering model
 
     """
+    context_cache_size = 128 # How many distinct contexts `predict` keeps the windows of when `reuse_contexts` is set
 
     def __init__(self, tokenizer: PreTrainedTokenizer, model: PreTrainedModel):
         # Load up model and tokenizer
@@ -208,17 +563,29 @@ class TransformersQuestionAnswering(AdaptiveModel):
         self.xmodel_instances = (XLNetForQuestionAnswering, XLMForQuestionAnswering)
 
     @classmethod
-    def load(cls, model_name_or_path: str) -> AdaptiveModel:
+    def load(cls, model_name_or_path: str, quantize: Quantization = None, share_weights: bool = False) -> AdaptiveModel:
         """Class method for loading and constructing this model
 
         * **model_name_or_path** - A key string of one of Transformer's pre-trained Question Answering (SQUAD) models
+        * **quantize** - A `Quantization` mode to load the model with, such as 'dynamic-int8'
+        * **share_weights** - Whether to memory-map the weights read-only, so every process serving this model shares one copy
         """
-        # QA tokenizers not compatible with fast tokenizers yet
-        tokenizer = AutoTokenizer.from_pretrained(model_name_or_path, use_fast=False)
         model = AutoModelForQuestionAnswering.from_pretrained(model_name_or_path)
+        # XLNet and XLM predictions still need the slow tokenizer's `SquadFeatures`
+        use_fast = not isinstance(model, (XLNetForQuestionAnswering, XLMForQuestionAnswering))
+        tokenizer = AutoTokenizer.from_pretrained(model_name_or_path, use_fast=use_fast)
         qa_model = cls(tokenizer, model)
+        if quantize is not None: qa_model.quantize(quantize)
+        if share_weights: qa_model.share_weights()
         return qa_model
 
+    @property
+    def _context_windows(self):
+        "The `_ContextWindows` of a context and windowing settings, for the last `context_cache_size` distinct ones"
+        if '_windows' not in self.__dict__:
+            self._windows = lru_cache(maxsize=self.context_cache_size)(partial(_ContextWindows, self.tokenizer))
+        return self._windows
+
     def predict(
         self,
         query: Union[List[str], str],
@@ -233,12 +600,14 @@ class TransformersQuestionAnswering(AdaptiveModel):
         max_seq_length: int = 512,
         doc_stride: int = 128,
         max_query_length: int = 64,
+        reuse_contexts: bool = False,
+        top_k: int = None,
         **kwargs,
     ) -> Tuple[Tuple[str, List[OrderedDict]], Tuple[OrderedDict, OrderedDict]]:
         """Predict method for running inference using the pre-trained question answering model
 
-        * **query** - String or list of strings that specify the ordered questions corresponding to `context`
-        * **context** - String or list of strings that specify the ordered contexts corresponding to `query`
+        * **query** - String or list of strings that specify the ordered questions corresponding to `context`. A single question is asked of every context
+        * **context** - String or list of strings that specify the ordered contexts corresponding to `query`. A single context is used for every question
         * **n_best_size** - Number of top n results you want
         * **mini_batch_size** - Mini batch size
         * **max_answer_length** - Maximum token length for answers that are returned
@@ -249,31 +618,72 @@ class TransformersQuestionAnswering(AdaptiveModel):
         * **max_seq_length** - Maximum context token length. Check model configs to see max sequence length the model was trained with
         * **doc_stride** - Number of token strides to take when splitting up conext into chunks of size `max_seq_length`
         * **max_query_length** - Maximum token length for queries
+        * **reuse_contexts** - Whether to tokenize each distinct context once and keep its windows for later calls, for many questions about the same contexts. The windows of a context are batched together
+        * **top_k** - If set, the `top_k` answers to each distinct question across every context it is asked of, such as retrieved passages, instead of `n_best_size` answers per pair. Each answer includes the `context_index` it came from, and its `start_char` and `end_char` in that context
         * **&ast;&ast;kwargs**(Optional) - Optional arguments for the Transformers model (mostly for saving evaluations)
         """
-        # Make string input consistent as list
-        if isinstance(query, str):
-            query = [query]
-            context = [context]
-        assert len(query) == len(context)
-        examples = self._mini_squad_processor(query=query, context=context)
-        features, dataset = squad_convert_examples_to_features(
-            examples,
-            self.tokenizer,
-            max_seq_length=max_seq_length,
-            doc_stride=doc_stride,
-            max_query_length=max_query_length,
-            is_training=False,
-            return_dataset='pt',
-            threads=1,
-        )
+        # Make string input consistent as list, and broadcast one question or context over the other
+        query, context = listify(query), listify(context)
+        if len(query) == 1: query = query * len(context)
+        if len(context) == 1: context = context * len(query)
+        if len(query) != len(context):
+            raise ValueError(f'`query` and `context` should be the same length, or either a single string, but got {len(query)} and {len(context)}')
+        fast = self.tokenizer.is_fast and not isinstance(self.model, self.xmodel_instances)
+        if top_k is not None and not fast:
+            raise ValueError('`top_k` needs a fast tokenizer and a model other than XLNet or XLM')
+        if fast and reuse_contexts:
+            examples, features, dataset = _spliced_squad_features(
+                query,
+                context,
+                self.tokenizer,
+                partial(self._context_windows, max_seq_length=max_seq_length, doc_stride=doc_stride, max_query_length=max_query_length),
+                max_query_length=max_query_length,
+            )
+        elif fast:
+            examples = self._mini_squad_processor(query=query, context=context)
+            features, dataset = _fast_squad_features(
+                examples,
+                self.tokenizer,
+                max_seq_length=max_seq_length,
+                doc_stride=doc_stride,
+                max_query_length=max_query_length,
+            )
+        else:
+            examples = self._mini_squad_processor(query=query, context=context)
+            features, dataset = squad_convert_examples_to_features(
+                examples,
+                self.tokenizer,
+                max_seq_length=max_seq_length,
+                doc_stride=doc_stride,
+                max_query_length=max_query_length,
+                is_training=False,
+                return_dataset='pt',
+                threads=1,
+            )
         all_results = []
 
         dl = DataLoader(dataset, batch_size=mini_batch_size)
 
         cb = QACallback(self.xmodel_instances, features)
 
-        all_results, _ = super().get_preds(dl=dl, cbs=[cb])
+        batches, _ = super().get_preds(dl=dl, cbs=[cb])
+        all_results = [r for batch in batches for r in batch]
+
+        if top_k is not None:
+            questions = list(dict.fromkeys(query))
+            groups = {q:i for i,q in enumerate(questions)}
+            n_best = _global_top_k(
+                features, all_results, [groups[query[f.example_index]] for f in features], len(questions),
+                context, top_k, max_answer_length
+            )
+            n_best = OrderedDict((str(i), o) for i,o in enumerate(n_best))
+            answers = OrderedDict((i, o[0]['text']) for i,o in n_best.items())
+            # One example per question, with every context it was asked of
+            examples = [
+                _QAExample(str(i), q, [c for qq,c in zip(query, context) if qq == q], None, None)
+                for i,q in enumerate(questions)
+            ]
+            return examples, answers, n_best
 
         if isinstance(self.model, self.xmodel_instances):
             start_n_top = (
@@ -328,25 +738,9 @@ class TransformersQuestionAnswering(AdaptiveModel):
 
         """
         assert len(query) == len(context)
-        examples = []
-        title = 'qa'
-        is_impossible = False
-        answer_text = None
-        start_position_character = None
-        answers = ['answer']
-        for idx, (q, c) in enumerate(zip(query, context)):
-            example = SquadExample(
-                qas_id=str(idx),
-                question_text=q,
-                context_text=c,
-                answer_text=answer_text,
-                start_position_character=start_position_character,
-                title=title,
-                is_impossible=is_impossible,
-                answers=answers,
-            )
-            examples.append(example)
-        return examples
+        # Each distinct context is only split into words once
+        words = {c:_split_words(c) for c in dict.fromkeys(context)}
+        return [_QAExample(str(idx), q, c, *words[c]) for idx, (q, c) in enumerate(zip(query, context))]
 
 # Cell
 class EasyQuestionAnswering:
@@ -375,13 +769,13 @@ class EasyQuestionAnswering:
     ) -> Union[QAResult, dict]:
         """Predicts top_n answer spans of query in regards to context
 
-        * **query** - String or list of strings that specify the ordered questions corresponding to `context`
-        * **context** - String or list of strings that specify the ordered contexts corresponding to `query`
+        * **query** - String or list of strings that specify the ordered questions corresponding to `context`. A single question is asked of every context
+        * **context** - String or list of strings that specify the ordered contexts corresponding to `query`. A single context is used for every question
         * **n_best_size** - The top n answers returned
         * **mini_batch_size** - Mini batch size for inference
         * **model_name_or_path** - Path to QA model or name of QA model at huggingface.co/models
         * **detail_level** - String or DetailLevel of what amount of information should be returned. If `None` will return `QAResult`
-        * **kwargs**(Optional) - Keyword arguments for `AdaptiveModel`s like `TransformersQuestionAnswering`
+        * **kwargs**(Optional) - Keyword arguments for `AdaptiveModel`s like `TransformersQuestionAnswering`, such as `top_k` to rank answers across every context a question is asked of
 
         **return** - Either a dictionary of results or a QAResult
         """
@@ -410,6 +804,6 @@ class EasyQuestionAnswering:
             **kwargs,
         )
 
-        result = QAResult(examples, top_answer, top_n_answers, n_best_size)
+        result = QAResult(examples, top_answer, top_n_answers, kwargs.get('top_k') or n_best_size)
 
         return result.to_dict(detail_level) if detail_level is not None else result
\ No newline at end of file
@@ -5,13 +5,13 @@ __all__ = ['logger', 'SequenceResult', 'TransformersSequenceClassifier', 'FlairS
 
 # Cell
 import logging
-from typing import List, Dict, Union, Tuple, Callable
+from typing import List, Dict, Union, Callable, Iterable, Iterator
+from functools import partial
 from collections import defaultdict, OrderedDict
 from pathlib import Path
 
 import torch
 from torch import nn
-from torch.utils.data import TensorDataset, DataLoader
 import datasets
 from datasets import ClassLabel
 from sklearn.metrics import accuracy_score, precision_recall_fscore_support
@@ -34,11 +34,10 @@ from transformers import (
     Trainer,
 )
 
-from ..model import AdaptiveModel
+from ..model import AdaptiveModel, BucketedDataLoader, Quantization, stream_predict
 from ..model_hub import HFModelResult, FlairModelResult
 
 from fastcore.basics import risinstance
-from fastcore.xtras import Path
 from ..result import DetailLevel, SentenceResult
 
 from torch import tensor
@@ -120,19 +119,25 @@ class TransformersSequenceClassifier(AdaptiveModel):
     @classmethod
     def load(
         cls,
-        model_name_or_path: Union[HFModelResult, str] # A key string of one of Transformer's pre-trained Sequence Classifier Model or a `HFModelResult`
+        model_name_or_path: Union[HFModelResult, str], # A key string of one of Transformer's pre-trained Sequence Classifier Model or a `HFModelResult`
+        quantize:Quantization = None, # A `Quantization` mode to load the model with, such as 'dynamic-int8'
+        share_weights:bool = False, # Whether to memory-map the weights read-only, so every process serving this model shares one copy
     ) -> AdaptiveModel:
         "Class method for loading and constructing this classifier"
         if isinstance(model_name_or_path, HFModelResult): model_name_or_path = model_name_or_path.name
         tokenizer = AutoTokenizer.from_pretrained(model_name_or_path, use_fast=True)
         model = AutoModelForSequenceClassification.from_pretrained(model_name_or_path)
         classifier = cls(tokenizer, model)
+        if quantize is not None: classifier.quantize(quantize)
+        if share_weights: classifier.share_weights()
         return classifier
 
     def predict(
         self,
         text: Union[List[Sentence], Sentence, List[str], str], # Sentences to run inference on
         mini_batch_size: int = 32, # Mini batch size
+        max_tokens: int = None, # A budget of padded tokens per batch, used instead of `mini_batch_size` if passed
+        stride: int = None, # If passed, texts longer than the model's max length are split into windows overlapping by `stride` tokens and their logits averaged
         **kwargs, # Optional arguments for the Transformers classifier
     ) -> List[Sentence]: # Returns a list of `Sentence` predictions
         "Predict method for running inference using the pre-trained sequence classifier model"
@@ -151,60 +156,44 @@ class TransformersSequenceClassifier(AdaptiveModel):
         if len(sentences) == 0:
             return sentences
 
-        # reverse sort all sequences by their length
-        rev_order_len_index = sorted(
-            range(len(sentences)), key=lambda k: len(sentences[k]), reverse=True
-        )
-        original_order_index = sorted(
-            range(len(rev_order_len_index)), key=lambda k: rev_order_len_index[k]
-        )
-
-        reordered_sentences: List[Union[DataPoint, str]] = [
-            sentences[index] for index in rev_order_len_index
-        ]
-
         # Turn all Sentence objects into strings
-        if isinstance(reordered_sentences[0], Sentence):
-            str_reordered_sentences = [
+        if isinstance(sentences[0], Sentence):
+            str_sentences = [
                 sentence.to_original_text() for sentence in sentences
             ]
         else:
-            str_reordered_sentences = reordered_sentences
+            str_sentences = sentences
 
-        dataset = self._tokenize(str_reordered_sentences)
-        dl = DataLoader(dataset, batch_size=mini_batch_size)
-        predictions: List[Tuple[str, float]] = []
+        # Batches are sorted by token length, so predictions come back in that order
+        dl = self._tokenize(str_sentences, mini_batch_size, max_tokens, stride)
 
         outputs, _ = super().get_preds(dl=dl)
-        logits = torch.cat([o['logits'] for o in outputs])
+        logits = torch.stack(dl.restore_order(list(torch.cat([o['logits'] for o in outputs]))))
+        if stride is not None:
+            # Windows from every text were batched together, so their logits are averaged per text
+            text_idxs = torch.tensor(dl.encodings['overflow_to_sample_mapping'])
+            pooled = logits.new_zeros(len(str_sentences), logits.shape[-1]).index_add_(0, text_idxs, logits)
+            logits = pooled / torch.bincount(text_idxs, minlength=len(str_sentences)).unsqueeze(-1)
         predictions = torch.softmax(logits, dim=1).tolist()
 
-        for text, pred in zip(str_reordered_sentences, predictions):
+        for text, pred in zip(str_sentences, predictions):
             # Initialize and assign labels to each class in each datapoint prediction
             text_sent = Sentence(text)
             for k, v in id2label.items():
                 text_sent.add_label(typename='sc', value=v, score=pred[k])
             results.append(text_sent)
 
-        # Order results back into original order
-        results = [results[index] for index in original_order_index]
-
         return results
 
     def _tokenize(
-        self, sentences: Union[List[Sentence], Sentence, List[str], str]
-    ) -> TensorDataset:
-        """ Batch tokenizes text and produces a `TensorDataset` with them """
-
-        # TODO: __call__ from tokenizer base class in the transformers library could automate/handle this
-        tokenized_text = self.tokenizer.batch_encode_plus(
-            sentences,
-            return_tensors='pt',
-            max_length=None,
-            add_special_tokens=True,
-            padding=True,
-            truncation=True
-        )
+        self,
+        sentences: List[str],
+        mini_batch_size: int = 32,
+        max_tokens: int = None,
+        stride: int = None,
+    ) -> BucketedDataLoader:
+        """ Batch tokenizes text into length-bucketed batches padded to their longest sequence, splitting long texts into windows if `stride` is passed """
+        keys = ('input_ids', 'attention_mask')
 
         # Bart, XLM, DistilBERT, RoBERTa, and XLM-RoBERTa don't use token_type_ids
         if isinstance(
@@ -215,17 +204,25 @@ class TransformersSequenceClassifier(AdaptiveModel):
                 AlbertForSequenceClassification,
             ),
         ):
-            dataset = TensorDataset(
-                tokenized_text['input_ids'],
-                tokenized_text['attention_mask'],
-                tokenized_text['token_type_ids'],
-            )
-        else:
-            dataset = TensorDataset(
-                tokenized_text['input_ids'], tokenized_text['attention_mask']
-            )
+            keys += ('token_type_ids',)
+
+        return BucketedDataLoader(
+            self.tokenizer,
+            sentences,
+            batch_size=mini_batch_size,
+            max_tokens=max_tokens,
+            keys=keys,
+            max_length=None,
+            add_special_tokens=True,
+            truncation=True,
+            **self._window_kwargs(stride),
+        )
 
-        return dataset
+    def _window_kwargs(self, stride:int=None) -> dict:
+        "Tokenizer arguments that split texts into windows of the model's max length overlapping by `stride` tokens"
+        if stride is None: return {}
+        if not self.tokenizer.is_fast: raise ValueError("Splitting texts into windows with `stride` requires a fast tokenizer")
+        return dict(stride=stride, return_overflowing_tokens=True)
 
 # Cell
 class FlairSequenceClassifier(AdaptiveModel):
@@ -269,7 +266,7 @@ class FlairSequenceClassifier(AdaptiveModel):
         return text
 
 # Cell
-from ..model_hub import HFModelHub, FlairModelHub
+from ..model_hub import HFModelHub, FlairModelHub, _resolver
 
 # Cell
 class EasySequenceClassifier:
@@ -277,8 +274,18 @@ class EasySequenceClassifier:
 
     def __init__(self):
         self.sequence_classifiers: Dict[AdaptiveModel] = defaultdict(bool)
-        self.hf_hub = HFModelHub()
-        self.flair_hub = FlairModelHub()
+
+    @property
+    def hf_hub(self) -> HFModelHub:
+        "The `HFModelHub`, only created on first use"
+        if '_hf_hub' not in self.__dict__: self._hf_hub = HFModelHub()
+        return self._hf_hub
+
+    @property
+    def flair_hub(self) -> FlairModelHub:
+        "The `FlairModelHub`, only created on first use since it lists the hosted models over the network"
+        if '_flair_hub' not in self.__dict__: self._flair_hub = FlairModelHub()
+        return self._flair_hub
 
     def tag_text(
         self,
@@ -293,39 +300,12 @@ class EasySequenceClassifier:
         # Load Text Classifier Model and Pytorch Module into tagger dict
         name = getattr(model_name_or_path, 'name', model_name_or_path)
         if not self.sequence_classifiers[name]:
-            """
-            self.sequence_classifiers[name] = TextClassifier.load(
-                model_name_or_path
-            )
-            """
-            if risinstance([FlairModelResult, HFModelResult], model_name_or_path):
-                try:
-                    self.sequence_classifiers[name] = FlairSequenceClassifier.load(name)
-                except:
-                    self.sequence_classifiers[name] = TransformersSequenceClassifier.load(name)
-
-            elif risinstance([str, Path], model_name_or_path) and (Path(model_name_or_path).exists() and Path(model_name_or_path).is_dir()):
-                # Load in previously existing model
-                try:
-                    self.sequence_classifiers[name] = FlairSequenceClassifier.load(name)
-                except:
-                    self.sequence_classifiers[name] = TransformersSequenceClassifier.load(name)
-
-            else:
-                # Flair
-                res = self.flair_hub.search_model_by_name(name, user_uploaded=True)
-                if len(res) < 1:
-                    # No models found
-                    res = self.hf_hub.search_model_by_name(model_name_or_path, user_uploaded=True)
-                    if len(res) < 1:
-                        logger.info("Not a valid `model_name_or_path` param")
-                        return [Sentence('')]
-                    else:
-                        name = res[0].name.replace('flairNLP', 'flair')
-                        self.sequence_classifiers[res[0].name] = TransformersSequenceClassifier.load(name)
-                else:
-                    name = res[0].name.replace('flairNLP/', '')
-                    self.sequence_classifiers[name] = FlairSequenceClassifier.load(name) # Returning the first should always be non-fast
+            classifier = _resolver.load('sequence-classification', model_name_or_path,
+                                        flair=[FlairSequenceClassifier.load], hf=[TransformersSequenceClassifier.load])
+            if classifier is None:
+                logger.info("Not a valid `model_name_or_path` param")
+                return [Sentence('')]
+            self.sequence_classifiers[name] = classifier
 
         classifier = self.sequence_classifiers[name]
         out = classifier.predict(
@@ -337,6 +317,15 @@ class EasySequenceClassifier:
         res = SequenceResult(out, class_names)
         return res.to_dict(detail_level)
 
+    def tag_text_stream(
+        self,
+        text: Iterable[Union[Sentence, str]], # Any iterable of strings or `Sentence`s, such as an open file or a database cursor
+        chunk_size: int = 256, # How many texts are tagged and yielded at a time
+        prefetch: int = 1, # How many chunks are tagged ahead of the one being consumed
+        **kwargs, # Keyword arguments for `tag_text`, such as `model_name_or_path` and `mini_batch_size`
+    ) -> Iterator[dict]: # What `tag_text` returns for each chunk of `text`, in order
+        "Lazily runs `tag_text` over `text` one chunk at a time, so inputs larger than memory can be streamed through"
+        return stream_predict(text, partial(self.tag_text, **kwargs), chunk_size=chunk_size, prefetch=prefetch)
 
     def tag_all(
         self,
@@ -4,11 +4,11 @@ __all__ = ['logger', 'TransformersSummarizer', 'EasySummarizer']
 
 # Cell
 import logging
-from typing import List, Dict, Union
+from typing import List, Dict, Union, Iterable, Iterator
+from functools import partial
 from collections import defaultdict
 
 import torch
-from torch.utils.data import TensorDataset, DataLoader
 
 from transformers import (
     AutoTokenizer,
@@ -20,14 +20,13 @@ from transformers import (
 )
 
 from ..callback import GeneratorCallback
-from ..model import AdaptiveModel
+from ..model import AdaptiveModel, BucketedDataLoader, Quantization, stream_predict
 from ..model_hub import HFModelResult, FlairModelResult
 
 from fastcore.basics import store_attr
 from fastcore.meta import delegates
 
 from fastai.callback.core import Callback, CancelBatchException
-from fastai.torch_core import apply
 
 # Cell
 logger = logging.getLogger(__name__)
@@ -53,12 +52,16 @@ class TransformersSummarizer(AdaptiveModel):
     @classmethod
     def load(
         cls,
-        model_name_or_path: str # A key string of one of Transformer's pre-trained Summarizer Model
+        model_name_or_path: str, # A key string of one of Transformer's pre-trained Summarizer Model
+        quantize:Quantization = None, # A `Quantization` mode to load the model with, such as 'dynamic-int8'
+        share_weights:bool = False, # Whether to memory-map the weights read-only, so every process serving this model shares one copy
     ) -> AdaptiveModel:
         "Class method for loading and constructing this classifier"
         tokenizer = AutoTokenizer.from_pretrained(model_name_or_path)
         model = AutoModelForSeq2SeqLM.from_pretrained(model_name_or_path)
         summarizer = cls(tokenizer, model)
+        if quantize is not None: summarizer.quantize(quantize)
+        if share_weights: summarizer.share_weights()
         return summarizer
 
     def predict(
@@ -69,6 +72,7 @@ class TransformersSummarizer(AdaptiveModel):
         min_length: int = 0, # The min length of the sequence to be generated
         max_length: int = 128, # The max length of the sequence to be generated. Between min_length and infinity
         early_stopping: bool = True, # If set to True beam search is stopped when at least num_beams sentences finished per batch
+        max_tokens: int = None, # A budget of padded tokens per batch, used instead of `mini_batch_size` if passed
         **kwargs, # Optional arguments for the Transformers `PreTrainedModel.generate()` method
     ) -> List[str]: # A list of predicted summarizations
         "Predict method for running inference using the pre-trained sequence classifier model"
@@ -81,61 +85,48 @@ class TransformersSummarizer(AdaptiveModel):
         if isinstance(self.model, T5ForConditionalGeneration):
             text = [f'summarize: {t}' for t in text]
 
-        dataset = self._tokenize(text)
-        dl = DataLoader(dataset, batch_size=mini_batch_size)
+        dl = self._tokenize(text, mini_batch_size, max_tokens)
 
-        summaries = []
-
-        logger.info(f'Running summarizer on {len(dataset)} text sequences')
+        logger.info(f'Running summarizer on {len(text)} text sequences')
         logger.info(f'Batch size = {mini_batch_size}')
 
         cb = GeneratorCallback(num_beams, min_length, max_length, early_stopping, **kwargs)
 
-        preds,_ = super().get_preds(dl=dl, cbs=[cb])
+        decode = lambda b, batch, output: self.tokenizer.batch_decode(
+            output,
+            skip_special_tokens=True,
+            clean_up_tokenization_spaces=False,
+        )
 
-        preds = apply(lambda x: x.squeeze(0), preds)
+        preds,_ = super().get_preds(dl=dl, cbs=[cb], decode=decode)
 
-        for o in preds:
-            summaries.append(
-                [
-                    self.tokenizer.decode(
-                        o,
-                        skip_special_tokens=True,
-                        clean_up_tokenization_spaces=False,
-                    )
-                ].pop()
-            )
+        summaries = [o for batch in preds for o in batch]
 
-        return {'summaries':summaries}
+        # Order summaries back into original order
+        return {'summaries':dl.restore_order(summaries)}
 
-    def _tokenize(self, text: Union[List[str], str]) -> TensorDataset:
-        "Batch tokenizes text and produces a `TensorDataset` with text"
+    def _tokenize(
+        self,
+        text: List[str],
+        mini_batch_size: int = 32,
+        max_tokens: int = None,
+    ) -> BucketedDataLoader:
+        "Batch tokenizes text into length-bucketed batches padded to their longest sequence"
 
         # Pre-trained Bart summarization model has a max length fo 1024 tokens for input
-        if isinstance(self.model, BartForConditionalGeneration):
-            tokenized_text = self.tokenizer.batch_encode_plus(
-                text,
-                return_tensors="pt",
-                max_length=1024,
-                add_special_tokens=True,
-                padding="max_length",
-            )
-        else:
-            tokenized_text = self.tokenizer.batch_encode_plus(
-                text,
-                return_tensors="pt",
-                padding="max_length",
-                add_special_tokens=True,
-            )
+        max_length = 1024 if isinstance(self.model, BartForConditionalGeneration) else None
 
         # Bart doesn't use `token_type_ids`
-        dataset = TensorDataset(
-            tokenized_text["input_ids"],
-            tokenized_text["attention_mask"],
+        return BucketedDataLoader(
+            self.tokenizer,
+            text,
+            batch_size=mini_batch_size,
+            max_tokens=max_tokens,
+            max_length=max_length,
+            add_special_tokens=True,
+            truncation=True,
         )
 
-        return dataset
-
 # Cell
 class EasySummarizer:
     "Summarization Module"
@@ -169,4 +160,14 @@ class EasySummarizer:
             max_length=max_length,
             early_stopping=early_stopping,
             **kwargs,
-        )
\ No newline at end of file
+        )
+
+    def summarize_stream(
+        self,
+        text: Iterable[str], # Any iterable of strings, such as an open file or a database cursor
+        chunk_size: int = 256, # How many texts are summarized and yielded at a time
+        prefetch: int = 1, # How many chunks are summarized ahead of the one being consumed
+        **kwargs, # Keyword arguments for `summarize`, such as `model_name_or_path` and `mini_batch_size`
+    ) -> Iterator[dict]: # What `summarize` returns for each chunk of `text`, in order
+        "Lazily runs `summarize` over `text` one chunk at a time, so inputs larger than memory can be streamed through"
+        return stream_predict(text, partial(self.summarize, **kwargs), chunk_size=chunk_size, prefetch=prefetch)
\ No newline at end of file
@@ -63,6 +63,7 @@ class TransformersTextGenerator(AdaptiveModel):
         text: Union[List[str], str], # Sentences to run inference on
         mini_batch_size: int = 32, # Mini batch size
         num_tokens_to_produce: int = 50, # Number of tokens you want to generate
+        use_cache: bool = True, # Whether to reuse `past_key_values` and only feed the newest token each step
     ) -> List[str]: # A list of predicted sentences
         "Predict method for running inference using the pre-trained sequence classifier model.  Keyword arguments for parameters of the method `Transformers.PreTrainedModel.generate()` can be used as well."
         with torch.no_grad():
@@ -97,6 +98,7 @@ class TransformersTextGenerator(AdaptiveModel):
                     inputs=inputs,
                     seq_len=batch[0].shape[1],
                     num_tokens_to_produce=num_tokens_to_produce,
+                    use_cache=use_cache,
                 )
                 results += generated_text
 
@@ -119,9 +121,11 @@ class TransformersTextGenerator(AdaptiveModel):
         return dataset
 
     def _batch_generate(
-        self, inputs: Dict, seq_len: int, num_tokens_to_produce: int
+        self, inputs: Dict, seq_len: int, num_tokens_to_produce: int, use_cache: bool = True
     ) -> List[str]:
         """Generates text data with varying text sizes"""
+        if use_cache:
+            return self._cached_batch_generate(inputs, seq_len, num_tokens_to_produce)
         input_ids = inputs["input_ids"]
         attn_mask = inputs["attention_masks"]
 
@@ -184,6 +188,75 @@ class TransformersTextGenerator(AdaptiveModel):
             for output in input_ids
         ]
 
+    def _cached_batch_generate(
+        self, inputs: Dict, seq_len: int, num_tokens_to_produce: int
+    ) -> List[str]:
+        """Generates text data with varying text sizes, reusing `past_key_values` between steps"""
+        input_ids = inputs["input_ids"]
+        attn_mask = inputs["attention_masks"]
+        batch_size = input_ids.shape[0]
+
+        pad_token_id = self.tokenizer.pad_token_id
+        eos_token_id = self.tokenizer.eos_token_id
+        eos_not_in_sents = torch.ones(batch_size).long().to(self.device)
+
+        # Preallocate the generated ids and the attention mask for every step
+        output_ids = input_ids.new_full((batch_size, seq_len + num_tokens_to_produce), pad_token_id)
+        output_ids[:, :seq_len] = input_ids
+        full_attn_mask = attn_mask.new_ones((batch_size, seq_len + num_tokens_to_produce))
+        full_attn_mask[:, :seq_len] = attn_mask
+
+        # we need to get the token ids of the last non-padded value
+        last_non_masked_idx = torch.sum(attn_mask, dim=1) - 1
+
+        # padded positions reuse the position of the last non-padded token
+        position_ids = torch.arange(seq_len, device=self.device).expand(batch_size, seq_len)
+        position_ids = torch.min(position_ids, last_non_masked_idx.view(-1, 1))
+
+        outputs = self.model(
+            input_ids,
+            attention_mask=full_attn_mask[:, :seq_len],
+            position_ids=position_ids,
+            use_cache=True,
+        )
+        # in the first decoding step, we want to use the 'real' last position for each sentence
+        next_token_logits = outputs[0][torch.arange(batch_size), last_non_masked_idx]
+        next_position_ids = last_non_masked_idx.view(-1, 1) + 1
+
+        cur_len = seq_len
+        for step in range(num_tokens_to_produce):
+            next_tokens = torch.argmax(next_token_logits, dim=-1)
+
+            # this updates which sentences have not seen an <EOS> token so far
+            # if one <EOS> token was seen the sentence is finished
+            eos_not_in_sents.mul_(next_tokens.ne(eos_token_id).long())
+
+            # either write a padding token here if <EOS> has been seen or write the next token
+            output_ids[:, cur_len] = next_tokens * eos_not_in_sents + pad_token_id * (
+                1 - eos_not_in_sents
+            )
+            cur_len += 1
+
+            # Stop early once every sentence in the batch has finished
+            if step == num_tokens_to_produce - 1 or eos_not_in_sents.sum() == 0:
+                break
+
+            # Only the newest token is fed, finished sentences are discarded so their input does not matter
+            outputs = self.model(
+                next_tokens.unsqueeze(-1),
+                past_key_values=outputs.past_key_values,
+                attention_mask=full_attn_mask[:, :cur_len],
+                position_ids=next_position_ids,
+                use_cache=True,
+            )
+            next_token_logits = outputs[0][:, -1, :]
+            next_position_ids = next_position_ids + 1
+
+        return [
+            self.tokenizer.decode(output, skip_special_tokens=True)
+            for output in output_ids[:, :cur_len]
+        ]
+
 # Cell
 class EasyTextGenerator:
     "Text Generation Module"
@@ -197,6 +270,7 @@ class EasyTextGenerator:
         model_name_or_path: [str, HFModelResult] = "gpt2", # A model id or path to a pre-trained model repository or custom trained model directory
         mini_batch_size: int = 32, # Mini batch size
         num_tokens_to_produce: int = 50, # Number of tokens you want to generate
+        use_cache: bool = True, # Whether to reuse `past_key_values` and only feed the newest token each step
     ) -> List[str]: # A list of predicted sentences
         "Predict method for running inference using the pre-trained sequence classifier model. Keyword arguments for parameters of the method `Transformers.PreTrainedModel.generate()` can be used as well."
         name = getattr(model_name_or_path, 'name', model_name_or_path)
@@ -209,5 +283,6 @@ class EasyTextGenerator:
         return generator.predict(
             text=text,
             mini_batch_size=mini_batch_size,
-            num_tokens_to_produce=num_tokens_to_produce
+            num_tokens_to_produce=num_tokens_to_produce,
+            use_cache=use_cache
         )
\ No newline at end of file
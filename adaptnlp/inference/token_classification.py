@@ -4,13 +4,13 @@ __all__ = ['logger', 'TokenClassificationResult', 'TransformersTokenTagger', 'Fl
 
 # Cell
 import logging
-from typing import List, Dict, Union
+from typing import List, Dict, Tuple, Union, Iterable, Iterator
+from functools import partial
 from collections import defaultdict, OrderedDict
 
 import numpy as np
 
 import torch
-from torch.utils.data import TensorDataset
 
 from flair.data import Sentence
 from flair.models import SequenceTagger
@@ -28,13 +28,12 @@ from transformers import (
 
 from ..result import DetailLevel
 
-from ..model import AdaptiveModel, DataLoader
-from ..model_hub import HFModelResult, FlairModelResult, FlairModelHub, HFModelHub
+from ..model import AdaptiveModel, BucketedDataLoader, Quantization, stream_predict
+from ..model_hub import HFModelResult, FlairModelResult, _resolver
 
-from fastai.torch_core import to_detach, apply, to_device
+from fastai.torch_core import to_detach
 
-from fastcore.basics import Self, risinstance, filter_ex, listify
-from fastcore.xtras import Path
+from fastcore.basics import filter_ex, listify
 
 # Cell
 logger = logging.getLogger(__name__)
@@ -92,13 +91,17 @@ class TransformersTokenTagger(AdaptiveModel):
     @classmethod
     def load(
         cls,
-        model_name_or_path: str # A key string of one of Transformer's pre-trained Token Tagger Model or a `HFModelResult`
+        model_name_or_path: str, # A key string of one of Transformer's pre-trained Token Tagger Model or a `HFModelResult`
+        quantize:Quantization = None, # A `Quantization` mode to load the model with, such as 'dynamic-int8'
+        share_weights:bool = False, # Whether to memory-map the weights read-only, so every process serving this model shares one copy
     ) -> AdaptiveModel:
         "Class method for loading and constructing this tagger"
         if isinstance(model_name_or_path, HFModelResult): model_name_or_path = model_name_or_path.name
         tokenizer = AutoTokenizer.from_pretrained(model_name_or_path)
         model = AutoModelForTokenClassification.from_pretrained(model_name_or_path)
         tagger = cls(tokenizer, model)
+        if quantize is not None: tagger.quantize(quantize)
+        if share_weights: tagger.share_weights()
         return tagger
 
     def predict(
@@ -107,54 +110,71 @@ class TransformersTokenTagger(AdaptiveModel):
         mini_batch_size: int = 32, # Mini batch size
         grouped_entities: bool = True, # Return whole entity span strings
         detail_level:DetailLevel = DetailLevel.Low, # A level of detail to return
+        max_tokens: int = None, # A budget of padded tokens per batch, used instead of `mini_batch_size` if passed
+        stride: int = None, # If passed, texts longer than the model's max length are split into windows overlapping by `stride` tokens
         **kwargs, # Optional arguments for the Transformers tagger
     ) -> List[List[Dict]]: # Returns a list of lists of tagged entities
         "Predict method for running inference using the pre-trained token tagger model"
         if isinstance(text, str):
             text = [text]
-        results: List[Dict] = []
+        inputs, results = [], []
 
-        dataset = self._tokenize(text)
-        dl = DataLoader(dataset, batch_size=mini_batch_size)
+        dl = self._tokenize(text, mini_batch_size, max_tokens, stride)
 
-        logger.info(f'Running prediction on {len(dataset)} text sequences')
+        logger.info(f'Running prediction on {len(text)} text sequences')
         logger.info(f'Batch size = {mini_batch_size}')
 
-        outputs,_ = super().get_preds(dl=dl)
-
-        inputs = apply(to_device, [b for b in dl], device='cpu')
-        inputs = torch.cat(*inputs)
-        inputs = apply(Self.numpy(), inputs)
+        if stride is not None:
+            outputs,_ = super().get_preds(dl=dl)
+            # Windows from every text were batched together, so they are stitched back into whole texts first
+            for t, (logits, input_ids, offsets) in zip(text, self._merge_windows(dl, outputs, len(text), stride)):
+                inputs.append(input_ids)
+                results += self._generate_tagged_entities(
+                    logits=logits[None],
+                    input_ids=input_ids[None],
+                    masks=np.ones((1, len(input_ids)), dtype=bool),
+                    grouped_entities=grouped_entities,
+                    texts=[t],
+                    offsets=[offsets],
+                )
+        else:
+            # Each batch is only padded to its own longest sequence, so padding is stripped per input
+            # Character offsets of each token, only available from fast tokenizers
+            offsets = dl.encodings['offset_mapping'] if 'offset_mapping' in dl.encodings else None
+            def decode(b, batch, output):
+                idxs = dl.batches[b]
+                input_ids, masks = batch['input_ids'].numpy(), batch['attention_mask'].numpy().astype(bool)
+                return [ids[mask] for ids, mask in zip(input_ids, masks)], self._generate_tagged_entities(
+                    logits=output['logits'].numpy(),
+                    input_ids=input_ids,
+                    masks=masks,
+                    grouped_entities=grouped_entities,
+                    texts=[text[i] for i in idxs],
+                    offsets=[offsets[i] for i in idxs] if offsets is not None else None,
+                )
 
-        outputs = torch.cat([o['logits'] for o in outputs])
-        outputs = apply(to_detach, outputs, cpu=True)
-        outputs = apply(Self.numpy(), outputs)
+            # Batches are decoded as they come out of the model, on a worker thread if pipelining is enabled
+            decoded,_ = super().get_preds(dl=dl, decode=decode)
+            for batch_inputs, batch_results in decoded:
+                inputs += batch_inputs
+                results += batch_results
 
-        # Iterate through batch for tagged token predictions
-        for idx, pred in enumerate(outputs):
-            entities = pred
-            input_ids = inputs[idx]
-            tagged_entities = self._generate_tagged_entities(
-                entities=entities,
-                input_ids=input_ids,
-                grouped_entities=grouped_entities
-            )
-            results += tagged_entities
+            # Order results back into original order
+            inputs, results = dl.restore_order(inputs), dl.restore_order(results)
 
         results = TokenClassificationResult(text, inputs, results)
 
         return results.to_dict(detail_level) if detail_level is not None else detail_level
 
     def _tokenize(
-        self, sentences: Union[List[Sentence], Sentence, List[str], str]
-    ) -> TensorDataset:
-        "Batch tokenizes text and produces a `TensorDataset` with them"
-
-        tokenized_text = self.tokenizer.batch_encode_plus(
-            sentences,
-            return_tensors="pt",
-            max_length=None,
-        )
+        self,
+        sentences: List[str],
+        mini_batch_size: int = 32,
+        max_tokens: int = None,
+        stride: int = None,
+    ) -> BucketedDataLoader:
+        "Batch tokenizes text into length-bucketed batches padded to their longest sequence, splitting long texts into windows if `stride` is passed"
+        keys = ("input_ids", "attention_mask")
 
         # Bart, XLM, DistilBERT, RoBERTa, and XLM-RoBERTa don't use token_type_ids
         if isinstance(
@@ -165,107 +185,150 @@ class TransformersTokenTagger(AdaptiveModel):
                 AlbertForSequenceClassification,
             ),
         ):
-            dataset = TensorDataset(
-                tokenized_text["input_ids"],
-                tokenized_text["attention_mask"],
-                tokenized_text["token_type_ids"],
-            )
-        else:
-            dataset = TensorDataset(
-                tokenized_text["input_ids"], tokenized_text["attention_mask"]
-            )
+            keys += ("token_type_ids",)
+
+        return BucketedDataLoader(
+            self.tokenizer,
+            sentences,
+            batch_size=mini_batch_size,
+            max_tokens=max_tokens,
+            keys=keys,
+            max_length=None,
+            return_offsets_mapping=self.tokenizer.is_fast,
+            **self._window_kwargs(stride),
+        )
 
-        return dataset
+    def _window_kwargs(self, stride:int=None) -> dict:
+        "Tokenizer arguments that split texts into windows of the model's max length overlapping by `stride` tokens"
+        if stride is None: return {}
+        if not self.tokenizer.is_fast: raise ValueError("Splitting texts into windows with `stride` requires a fast tokenizer")
+        return dict(truncation=True, stride=stride, return_overflowing_tokens=True, return_special_tokens_mask=True)
+
+    def _merge_windows(
+        self,
+        dl: BucketedDataLoader, # Windows of the texts, tokenized with `_window_kwargs`
+        outputs: list, # The model outputs of each batch in `dl`
+        n_texts: int, # How many texts were split into windows
+        stride: int, # How many tokens neighbouring windows overlap by
+    ) -> List[tuple]: # The logits, input ids and character offsets of every token of each text
+        "Stitches windows back into whole texts, taking each token's logits from the window it has the most context in"
+        enc = dl.encodings
+        window_logits = {}
+        for idxs, batch, output in zip(dl.batches, dl, outputs):
+            logits = to_detach(output['logits'], cpu=True).numpy()
+            for i, row, mask in zip(idxs, logits, batch[1].numpy().astype(bool)): window_logits[i] = row[mask]
+        windows = [[] for _ in range(n_texts)]
+        for i, t in enumerate(enc['overflow_to_sample_mapping']): windows[t].append(i)
+
+        merged = []
+        for text_windows in windows:
+            positions, scores, logits, input_ids, offsets = [], [], [], [], []
+            for w, i in enumerate(text_windows):
+                # Special tokens like [CLS] and [SEP] are dropped, they belong to no position in the text
+                content = np.flatnonzero(~np.asarray(enc['special_tokens_mask'][i], dtype=bool))
+                n = len(content)
+                # Every window after the first starts `stride` tokens before the end of the one before it
+                if w == 0: step = n - stride
+                k = np.arange(n)
+                positions.append(w * step + k)
+                # A token's context is the number of tokens on its shorter side, favouring longer windows on ties
+                scores.append(np.minimum(k, n - 1 - k) + 0.01 * n)
+                logits.append(window_logits[i][content])
+                input_ids.append(np.asarray(enc['input_ids'][i])[content])
+                offsets.append(np.asarray(enc['offset_mapping'][i], dtype=int).reshape(-1, 2)[content])
+            positions, scores = np.concatenate(positions), np.concatenate(scores)
+            # Sort by position then by descending context, and keep the first window for each position
+            order = np.lexsort((-scores, positions))
+            keep = order[np.r_[True, positions[order][1:] != positions[order][:-1]]] if len(order) else order
+            merged.append(tuple(np.concatenate(o)[keep] for o in (logits, input_ids, offsets)))
+        return merged
 
     # `_group_entites` and `_generate_tagged_entities` modified from pipeline code snippet from Transformers
     def _group_entities(
-        self, entities: List[dict], idx_start: int, idx_end: int
+        self,
+        entity: str, # The label shared by every token in the group
+        score: float, # The mean score of the tokens in the group
+        tokens: List[str], # The tokens in the group
+        idx_start: int, # The index before the first token in the group
+        idx_end: int, # The index of the last token in the group
+        text: str = None, # The text the tokens came from
+        span: tuple = None, # The start and end character of the group in `text`
     ) -> Dict:
         """Returns grouped entities"""
-        # Get the last entity in the entity group
-        entity = entities[-1]["entity"]
-        scores = np.mean([entity["score"] for entity in entities])
-        tokens = [entity["word"] for entity in entities]
-
         entity_group = {
             "entity": entity,
-            "score": np.mean(scores),
-            "word": self.tokenizer.convert_tokens_to_string(tokens),
+            "score": score,
+            "word": text[span[0]:span[1]] if text is not None and span is not None else self.tokenizer.convert_tokens_to_string(tokens),
             "offsets": (idx_start, idx_end),
         }
+        if span is not None: entity_group["start"], entity_group["end"] = span
         return entity_group
 
     def _generate_tagged_entities(
-        self, entities: np.ndarray, input_ids: np.ndarray, grouped_entities: bool = True
-    ) -> List[Dict]:
-        """Generate full list of entities given tagged token predictions and input_ids"""
-
-        score = np.exp(entities) / np.exp(entities).sum(-1, keepdims=True)
-        labels_idx = score.argmax(axis=-1)
+        self,
+        logits: np.ndarray, # A batch of logits shaped (batch size, sequence length, number of labels)
+        input_ids: np.ndarray, # The input ids of the batch
+        masks: np.ndarray, # A boolean array of which tokens in the batch are not padding
+        grouped_entities: bool = True, # Whether to group adjacent tokens sharing a label into one entity
+        texts: List[str] = None, # The text of each sequence in the batch
+        offsets: List[list] = None, # The character offsets of each token in each unpadded sequence, from a fast tokenizer
+    ) -> List[List[Dict]]: # The tagged entities of each sequence in the batch
+        """Generate full list of entities given a batch of tagged token predictions and input_ids"""
+        # Softmax over the whole batch at once, subtracting the max so `np.exp` can't overflow
+        score = np.exp(logits - logits.max(-1, keepdims=True))
+        score /= score.sum(-1, keepdims=True)
+        labels_idx = score.argmax(-1)
+        score = np.take_along_axis(score, labels_idx[..., None], -1)[..., 0]
+
+        id2label = self.model.config.id2label
+        is_entity = np.array([id2label[i] not in ["O"] for i in range(len(id2label))])
+        # Indices within each sequence once padding is stripped
+        positions = masks.cumsum(-1) - 1
+        # Special tokens like [CLS] and [SEP] are never part of an entity
+        filtered = is_entity[labels_idx] & masks & ~np.isin(input_ids, self.tokenizer.all_special_ids)
 
         answers = []
-        entities = []
-        entity_groups = []
-        entity_group_disagg = []
-        # Filter to labels not in `self.ignore_labels`
-        filtered_labels_idx = [
-            (idx, label_idx)
-            for idx, label_idx in enumerate(labels_idx)
-            if self.model.config.id2label[label_idx] not in ["O"]
-        ]
-
-        for idx, label_idx in filtered_labels_idx:
-            # print(tokenizer.convert_ids_to_tokens(int(input_ids[idx])))
-            entity = {
-                "word": self.tokenizer.convert_ids_to_tokens(int(input_ids[idx])),
-                "score": score[idx][label_idx].item(),
-                "entity": self.model.config.id2label[label_idx],
-                "index": idx,
-            }
-            last_idx, _ = filtered_labels_idx[-1]
-            if grouped_entities:
-                if not entity_group_disagg:
-                    entity_group_disagg += [entity]
-                    if idx == last_idx:
-                        entity_groups += [
-                            self._group_entities(
-                                entity_group_disagg, idx - len(entity_group_disagg), idx
-                            )
-                        ]
-                    continue
-
-                # If the current entity is similar and adjacent to the previous entity, append it to the disaggregated entity group
-                if (
-                    entity["entity"] == entity_group_disagg[-1]["entity"]
-                    and entity["index"] == entity_group_disagg[-1]["index"] + 1
-                ):
-                    entity_group_disagg += [entity]
-                    # Group the entities at the last entity
-                    if idx == last_idx:
-                        entity_groups += [
-                            self._group_entities(
-                                entity_group_disagg, idx - len(entity_group_disagg), idx
-                            )
-                        ]
-                # If the current entity is different from the previous entity, aggregate the disaggregated entity group
-                else:
-                    entity_groups += [
-                        self._group_entities(
-                            entity_group_disagg,
-                            entity_group_disagg[-1]["index"] - len(entity_group_disagg),
-                            entity_group_disagg[-1]["index"],
-                        )
-                    ]
-                    entity_group_disagg = [entity]
-
-            entities += [entity]
-
-        # Append
-        if grouped_entities:
-            answers += [entity_groups]
-        else:
-            answers += [entities]
-
+        for b, (ids, keep, label_row, score_row, position_row) in enumerate(zip(input_ids, filtered, labels_idx, score, positions)):
+            idxs = position_row[keep]
+            labels, scores = label_row[keep], score_row[keep]
+            tokens = self.tokenizer.convert_ids_to_tokens(ids[keep].tolist())
+            if offsets is not None:
+                spans = np.asarray(offsets[b], dtype=int).reshape(-1, 2)[idxs]
+                char_starts, char_ends = spans[:, 0].tolist(), spans[:, 1].tolist()
+            if not grouped_entities:
+                entities = [
+                    {"word": w, "score": sc, "entity": id2label[l], "index": i}
+                    for w, sc, l, i in zip(tokens, scores.tolist(), labels.tolist(), idxs.tolist())
+                ]
+                if offsets is not None:
+                    for entity, start, end in zip(entities, char_starts, char_ends):
+                        entity["start"], entity["end"] = start, end
+                answers.append(entities)
+                continue
+            if not len(idxs):
+                answers.append([])
+                continue
+            # Run-length encode the entities: a group starts wherever the label changes or the tokens stop being adjacent
+            starts = np.flatnonzero(np.r_[True, (np.diff(idxs) != 1) | (np.diff(labels) != 0)])
+            ends = np.r_[starts[1:], len(idxs)]
+            group_scores = np.add.reduceat(scores, starts) / (ends - starts)
+            if offsets is not None:
+                # A group spans its tokens that cover characters, a token covering none can't stretch or invert it
+                empty = spans[:, 0] == spans[:, 1]
+                group_starts = np.minimum.reduceat(np.where(empty, np.iinfo(int).max, spans[:, 0]), starts)
+                group_ends = np.maximum.reduceat(np.where(empty, -1, spans[:, 1]), starts)
+                empty = group_ends < 0
+                group_starts[empty] = group_ends[empty] = spans[starts[empty], 0]
+                group_spans = list(zip(group_starts.tolist(), group_ends.tolist()))
+            idxs, labels = idxs.tolist(), labels.tolist()
+            answers.append([
+                self._group_entities(
+                    id2label[labels[start]], group_score, tokens[start:end], idxs[end - 1] - (end - start), idxs[end - 1],
+                    text=texts[b] if texts is not None else None,
+                    span=group_spans[g] if offsets is not None else None,
+                )
+                for g, (start, end, group_score) in enumerate(zip(starts.tolist(), ends.tolist(), group_scores.tolist()))
+            ])
         return answers
 
 # Cell
@@ -288,54 +351,63 @@ class FlairTokenTagger(AdaptiveModel):
         tagger = cls(model_name_or_path)
         return tagger
 
-    def _split_articles(self, tagged_articles):
+    def _split_sentences(
+        self,
+        text: List[str], # Articles to split
+    ) -> Tuple[List[Sentence], List[int], List[int]]: # The sentences, the article each came from, and its character offset in that article
+        "Splits each article into sentences, recording where every sentence came from"
+        sentences, article_idxs, offsets = [], [], []
+        for i, article in enumerate(text):
+            for sentence in self.splitter.split(article):
+                sentences.append(sentence)
+                article_idxs.append(i)
+                offsets.append(sentence.start_pos)
+        return sentences, article_idxs, offsets
+
+    def _split_articles(
+        self,
+        text: List[str], # Original articles
+        sentences: List[Sentence], # Tagged sentences from every article, in order
+        article_idxs: List[int], # The article each sentence came from
+        offsets: List[int], # The character offset of each sentence in its article
+    ) -> List[dict]:
         "Takes merged NER results and splits them back out into their original articles"
-        all_payloads = []
-        for article in tagged_articles:
-            payload = [sentence.to_dict(tag_type=self.tagger.tag_type) for sentence in article]
-            curr_pos = 0
-            new_payload = {}
-            new_payload['entities'] = []
-            new_payload['labels'] = []
-            text = ''
-            for i, pay in enumerate(payload):
-                entities = pay['entities']
-                for e in entities:
-                    labels = e['labels']
-                    d = labels[0].to_dict()
-                    e['value'] = d['value']
-                    e['confidence'] = d['confidence']
-
-                if i > 0:
-                    for e in entities:
-                        # Get back the original positions
-                        e['start_pos'] += curr_length
-                        e['end_pos'] += curr_length
-
-                text += pay['text'] + ' '
-                curr_length = len(text)
-                new_payload['entities'] += entities
-            new_payload['text'] = text
-            all_payloads.append(new_payload)
+        all_payloads = [{'entities':[], 'labels':[], 'text':article} for article in text]
+        for sentence, i, offset in zip(sentences, article_idxs, offsets):
+            for e in sentence.to_dict(tag_type=self.tagger.tag_type)['entities']:
+                d = e['labels'][0].to_dict()
+                e['value'] = d['value']
+                e['confidence'] = d['confidence']
+                # Get back the original positions
+                e['start_pos'] += offset
+                e['end_pos'] += offset
+                all_payloads[i]['entities'].append(e)
         return all_payloads
 
     def decode_articles(
         self,
         original_text: Union[List[str], str], # Original text inference was run on
-        sentences: List[Sentence] # Sentences inference was run on
+        sentences: List[Sentence], # Sentences inference was run on, in the order they appear in `original_text`
+        article_idxs: List[int] = None, # The article each sentence came from, found by scanning `original_text` if not passed
+        offsets: List[int] = None, # The character offset of each sentence in its article, found by scanning `original_text` if not passed
     ) -> List[dict]:
         "Decodes `text` back into articles and extracts entities"
         if not isinstance(original_text, list):
             original_text = [original_text]
-        for i,sentence in enumerate(original_text):
-            if isinstance(sentence, Sentence):
-                text[i] = sentence.to_original_text()
-        tagged_articles = [[] for _ in range(len(original_text))]
-        for sentence in sentences:
-            for i, article in enumerate(original_text):
-                if sentence.to_original_text() in article:
-                    tagged_articles[i].append(sentence)
-        return self._split_articles(tagged_articles)
+        original_text = [o.to_original_text() if isinstance(o, Sentence) else o for o in original_text]
+        if article_idxs is None or offsets is None:
+            # Sentences are in order, so a single pass over the articles finds them all
+            article_idxs, offsets = [], []
+            i, pos = 0, 0
+            for sentence in sentences:
+                sentence_text = sentence.to_original_text()
+                while original_text[i].find(sentence_text, pos) < 0:
+                    i, pos = i+1, 0
+                pos = original_text[i].find(sentence_text, pos)
+                article_idxs.append(i)
+                offsets.append(pos)
+                pos += len(sentence_text)
+        return self._split_articles(original_text, sentences, article_idxs, offsets)
 
     def predict(
         self,
@@ -347,16 +419,12 @@ class FlairTokenTagger(AdaptiveModel):
         "Predict method for running inference using the pre-trained token tagger model"
         if not isinstance(text, list):
             text = [text]
-        for i,sentence in enumerate(text):
-            if isinstance(sentence, Sentence):
-                text[i] = sentence.to_original_text()
-        tagged_articles = [[] for _ in range(len(text))]
-        t = '\n'.join(text)
-        sentences = self.splitter.split(t)
+        text = [o.to_original_text() if isinstance(o, Sentence) else o for o in text]
+        sentences, article_idxs, offsets = self._split_sentences(text)
         self.tagger.predict(sentences, mini_batch_size=mini_batch_size, **kwargs)
 
         if not raw:
-            return self.decode_articles(text, sentences)
+            return self.decode_articles(text, sentences, article_idxs, offsets)
         return sentences
 
 # Cell
@@ -378,40 +446,12 @@ class EasyTokenTagger:
         # Load Sequence Tagger Model and Pytorch Module into tagger dict
         name = getattr(model_name_or_path, 'name', model_name_or_path)
         if not self.token_taggers[name]:
-            """
-            self.token_taggers[model_name_or_path] = SequenceTagger.load(
-                model_name_or_path
-            )
-            """
-            if risinstance([FlairModelResult, HFModelResult], model_name_or_path):
-                try:
-                    self.token_taggers[name] = FlairTokenTagger.load(name)
-                except:
-                    self.token_taggers[name] = TransformersTokenTagger.load(name)
-            elif risinstance([str, Path], model_name_or_path) and (Path(model_name_or_path).exists() and Path(model_name_or_path).is_dir()):
-                # Load in previously existing model
-                try:
-                    self.token_taggers[name] = FlairTokenTagger.load(name)
-                except:
-                    self.token_taggers[name] = TransformersTokenTagger.load(name)
-            else:
-                _flair_hub = FlairModelHub()
-                _hf_hub = HFModelHub()
-                res = _flair_hub.search_model_by_name(name, user_uploaded=True)
-                if len(res) < 1:
-                    # No models found
-                    res = _hf_hub.search_model_by_name(name, user_uploaded=True)
-                    if len(res) < 1:
-                        logger.info("Not a valid `model_name_or_path` param")
-                        return [Sentence('')]
-                    else:
-                        res[0].name.replace('flairNLP', 'flair')
-                        self.token_taggers[res[0].name] = TransformersTokenTagger.load(res[0].name)
-                        name = res[0].name
-
-                else:
-                    name = res[0].name.replace('flairNLP/', '')
-                    self.token_taggers[name] = FlairTokenTagger.load(name) # Returning the first should always be the non-fast option
+            tagger = _resolver.load('token-classification', model_name_or_path,
+                                    flair=[FlairTokenTagger.load], hf=[TransformersTokenTagger.load])
+            if tagger is None:
+                logger.info("Not a valid `model_name_or_path` param")
+                return [Sentence('')]
+            self.token_taggers[name] = tagger
 
         tagger = self.token_taggers[name]
         if isinstance(tagger, TransformersTokenTagger):
@@ -428,6 +468,16 @@ class EasyTokenTagger:
                 **kwargs,
             )
 
+    def tag_text_stream(
+        self,
+        text: Iterable[Union[Sentence, str]], # Any iterable of strings or `Sentence`s, such as an open file or a database cursor
+        chunk_size: int = 256, # How many texts are tagged and yielded at a time
+        prefetch: int = 1, # How many chunks are tagged ahead of the one being consumed
+        **kwargs, # Keyword arguments for `tag_text`, such as `model_name_or_path` and `mini_batch_size`
+    ) -> Iterator: # What `tag_text` returns for each chunk of `text`, in order
+        "Lazily runs `tag_text` over `text` one chunk at a time, so inputs larger than memory can be streamed through"
+        return stream_predict(text, partial(self.tag_text, **kwargs), chunk_size=chunk_size, prefetch=prefetch)
+
     def tag_all(
         self,
         text: Union[List[Sentence], Sentence, List[str], str], # Text input, it can be a string or any of Flair's `Sentence` input formats
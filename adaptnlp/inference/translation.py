@@ -4,11 +4,11 @@ __all__ = ['logger', 'TranslationResult', 'TransformersTranslator', 'EasyTransla
 
 # Cell
 import logging
-from typing import List, Dict, Union
+from typing import List, Dict, Union, Iterable, Iterator
+from functools import partial
 from collections import defaultdict, OrderedDict
 
 import torch
-from torch.utils.data import TensorDataset, DataLoader
 
 from transformers import (
     AutoTokenizer,
@@ -18,12 +18,9 @@ from transformers import (
     T5ForConditionalGeneration,
 )
 
-from ..model import AdaptiveModel
+from ..model import AdaptiveModel, BucketedDataLoader, Quantization, stream_predict
 from ..callback import GeneratorCallback
 
-from fastai.torch_core import apply, to_device
-
-from fastcore.basics import Self
 from ..model_hub import HFModelResult, FlairModelResult, HFModelHub, FlairModelHub
 from ..result import DetailLevel
 
@@ -86,12 +83,16 @@ class TransformersTranslator(AdaptiveModel):
     @classmethod
     def load(
         cls,
-        model_name_or_path: str # A key string of one of Transformer's pre-trained translator Model
+        model_name_or_path: str, # A key string of one of Transformer's pre-trained translator Model
+        quantize:Quantization = None, # A `Quantization` mode to load the model with, such as 'dynamic-int8'
+        share_weights:bool = False, # Whether to memory-map the weights read-only, so every process serving this model shares one copy
     ) -> AdaptiveModel:
         "Class method for loading and constructing this classifier"
         tokenizer = AutoTokenizer.from_pretrained(model_name_or_path)
         model = AutoModelForSeq2SeqLM.from_pretrained(model_name_or_path)
         translator = cls(tokenizer, model)
+        if quantize is not None: translator.quantize(quantize)
+        if share_weights: translator.share_weights()
         return translator
 
     def predict(
@@ -104,6 +105,7 @@ class TransformersTranslator(AdaptiveModel):
         max_length: int = 128, # The max length of the sequence to be generated. Between min_length and infinity
         early_stopping: bool = True, # If set to `True` beam search is stopped when at least num_beams sentences finished per batch
         detail_level:DetailLevel = DetailLevel.Low, # The level of detail to return
+        max_tokens: int = None, # A budget of padded tokens per batch, used instead of `mini_batch_size` if passed
         **kwargs, # Optional arguments for the Transformers `PreTrainedModel.generate()` method
     ) -> List[str]: # A list of translated sentences
         "Predict method for running inference using the pre-trained sequence classifier model. Keyword arguments for parameters of the method `Transformers.PreTrainedModel.generate()` can be used as well"
@@ -116,29 +118,25 @@ class TransformersTranslator(AdaptiveModel):
         if isinstance(self.model, T5ForConditionalGeneration):
             text = [f'{t5_prefix}: {t}' for t in text]
 
-        dataset = self._tokenize(text)
-        dl = DataLoader(dataset, batch_size=mini_batch_size)
-        translations = []
+        dl = self._tokenize(text, mini_batch_size, max_tokens)
 
-        logger.info(f'Running translator on {len(dataset)} text sequences')
+        logger.info(f'Running translator on {len(text)} text sequences')
         logger.info(f'Batch size = {mini_batch_size}')
 
         cb = GeneratorCallback(num_beams, min_length, max_length, early_stopping, **kwargs)
 
-        preds,_ = super().get_preds(dl=dl, cbs=[cb])
+        decode = lambda b, batch, output: self.tokenizer.batch_decode(
+            output,
+            skip_special_tokens=True,
+            clean_up_tokenization_spaces=False,
+        )
 
-        preds = apply(Self.squeeze(0), preds)
+        preds,_ = super().get_preds(dl=dl, cbs=[cb], decode=decode)
 
-        for o in preds:
-            translations.append(
-                [
-                    self.tokenizer.decode(
-                        o,
-                        skip_special_tokens=True,
-                        clean_up_tokenization_spaces=False,
-                    )
-                ].pop()
-            )
+        translations = [o for batch in preds for o in batch]
+
+        # Order translations back into original order
+        translations = dl.restore_order(translations)
 
         languages = t5_prefix.strip('translate ').split(' to ')
 
@@ -146,24 +144,25 @@ class TransformersTranslator(AdaptiveModel):
 
         return res if detail_level is None else res.to_dict(detail_level)
 
-    def _tokenize(self, text: Union[List[str], str]) -> TensorDataset:
-        """ Batch tokenizes text and produces a `TensorDataset` with text """
+    def _tokenize(
+        self,
+        text: List[str],
+        mini_batch_size: int = 32,
+        max_tokens: int = None,
+    ) -> BucketedDataLoader:
+        """ Batch tokenizes text into length-bucketed batches padded to their longest sequence """
 
-        tokenized_text = self.tokenizer.batch_encode_plus(
+        # Bart doesn't use `token_type_ids`
+        return BucketedDataLoader(
+            self.tokenizer,
             text,
-            return_tensors='pt',
+            batch_size=mini_batch_size,
+            max_tokens=max_tokens,
             max_length=512,
-            padding='max_length',
             add_special_tokens=True,
+            truncation=True,
         )
 
-        # Bart doesn't use `token_type_ids`
-        dataset = TensorDataset(
-            tokenized_text['input_ids'],
-            tokenized_text['attention_mask'],
-        )
-        return dataset
-
 # Cell
 class EasyTranslator:
     "Translation Module"
@@ -201,4 +200,14 @@ class EasyTranslator:
             max_length=max_length,
             early_stopping=early_stopping,
             **kwargs,
-        )
\ No newline at end of file
+        )
+
+    def translate_stream(
+        self,
+        text: Iterable[str], # Any iterable of strings, such as an open file or a database cursor
+        chunk_size: int = 256, # How many texts are translated and yielded at a time
+        prefetch: int = 1, # How many chunks are translated ahead of the one being consumed
+        **kwargs, # Keyword arguments for `translate`, such as `model_name_or_path` and `mini_batch_size`
+    ) -> Iterator[dict]: # What `translate` returns for each chunk of `text`, in order
+        "Lazily runs `translate` over `text` one chunk at a time, so inputs larger than memory can be streamed through"
+        return stream_predict(text, partial(self.translate, **kwargs), chunk_size=chunk_size, prefetch=prefetch)
\ No newline at end of file
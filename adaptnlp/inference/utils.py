@@ -25,6 +25,8 @@ import math
 import re
 import string
 
+import numpy as np
+
 from transformers.models.bert import BasicTokenizer
 
 # Cell
@@ -435,15 +437,51 @@ def get_final_text(pred_text, orig_text, do_lower_case, verbose_logging=False):
 
 # Internal Cell
 def _get_best_indexes(logits, n_best_size):
-    """Get the n-best logits from a list."""
-    index_and_score = sorted(enumerate(logits), key=lambda x: x[1], reverse=True)
+    """Get the indexes of the n-best logits, best first and ties in index order, partitioning rather than sorting them all."""
+    logits = np.asarray(logits)
+    if n_best_size <= 0: return np.zeros(0, dtype=np.int64)
+    if n_best_size < len(logits):
+        kth = logits[np.argpartition(-logits, n_best_size - 1)[n_best_size - 1]]
+        above = np.flatnonzero(logits > kth)
+        # Among logits equal to the n-th best, the earliest ones are kept
+        idxs = np.concatenate([above, np.flatnonzero(logits == kth)[:n_best_size - len(above)]])
+    else:
+        idxs = np.arange(len(logits))
+    return idxs[np.lexsort((idxs, -logits[idxs]))]
+
+# Internal Cell
+def _context_masks(feature, idxs):
+    """Whether each of `idxs` is a context token of `feature`, and whether `feature` is where it has the most context."""
+    if hasattr(feature, "context_tokens"):
+        # Features that keep their context tokens as arrays, such as those built by a fast tokenizer
+        return (
+            np.isin(idxs, feature.context_tokens),
+            np.isin(idxs, feature.context_tokens[feature.is_max_context]),
+        )
+    idxs = idxs.tolist()
+    return (
+        np.array([i in feature.token_to_orig_map for i in idxs], dtype=bool),
+        np.array([feature.token_is_max_context.get(i, False) for i in idxs], dtype=bool),
+    )
+
+# Internal Cell
+def _valid_spans(feature, start_indexes, end_indexes, max_answer_length):
+    """Every valid (start, end) pair of `start_indexes` and `end_indexes`, ordered by start then end index rank.
 
-    best_indexes = []
-    for i in range(len(index_and_score)):
-        if i >= n_best_size:
-            break
-        best_indexes.append(index_and_score[i][0])
-    return best_indexes
+    A valid span starts and ends in the context, starts where `feature` has the most context for it,
+    and is at most `max_answer_length` tokens long.
+    """
+    start_in_context, start_max_context = _context_masks(feature, start_indexes)
+    end_in_context, _ = _context_masks(feature, end_indexes)
+    starts, ends = np.meshgrid(start_indexes, end_indexes, indexing="ij")
+    length = ends - starts + 1
+    valid = (
+        (start_in_context & start_max_context)[:, None]
+        & end_in_context[None, :]
+        & (length >= 1)
+        & (length <= max_answer_length)
+    )
+    return starts[valid], ends[valid]
 
 # Internal Cell
 def _compute_softmax(scores):
@@ -505,7 +543,7 @@ def compute_predictions_logits(
     for (example_index, example) in enumerate(all_examples):
         features = example_index_to_features[example_index]
 
-        prelim_predictions = []
+        prelim_features, prelim_starts, prelim_ends, prelim_scores = [], [], [], []
         # keep track of the minimum score of null start+end of position 0
         score_null = 1000000  # large and positive
         min_null_feature_index = 0  # the paragraph slice with min null score
@@ -513,8 +551,10 @@ def compute_predictions_logits(
         null_end_logit = 0  # the end logit at the slice with min null score
         for (feature_index, feature) in enumerate(features):
             result = unique_id_to_result[feature.unique_id]
-            start_indexes = _get_best_indexes(result.start_logits, n_best_size)
-            end_indexes = _get_best_indexes(result.end_logits, n_best_size)
+            start_logits = np.asarray(result.start_logits)
+            end_logits = np.asarray(result.end_logits)
+            start_indexes = _get_best_indexes(start_logits, n_best_size)
+            end_indexes = _get_best_indexes(end_logits, n_best_size)
             # if we could have irrelevant answers, get the min score of irrelevant
             if version_2_with_negative:
                 feature_null_score = result.start_logits[0] + result.end_logits[0]
@@ -523,50 +563,46 @@ def compute_predictions_logits(
                     min_null_feature_index = feature_index
                     null_start_logit = result.start_logits[0]
                     null_end_logit = result.end_logits[0]
-            for start_index in start_indexes:
-                for end_index in end_indexes:
-                    # We could hypothetically create invalid predictions, e.g., predict
-                    # that the start of the span is in the question. We throw out all
-                    # invalid predictions.
-                    if start_index >= len(feature.tokens):
-                        continue
-                    if end_index >= len(feature.tokens):
-                        continue
-                    if start_index not in feature.token_to_orig_map:
-                        continue
-                    if end_index not in feature.token_to_orig_map:
-                        continue
-                    if not feature.token_is_max_context.get(start_index, False):
-                        continue
-                    if end_index < start_index:
-                        continue
-                    length = end_index - start_index + 1
-                    if length > max_answer_length:
-                        continue
-                    prelim_predictions.append(
-                        _PrelimPrediction(
-                            feature_index=feature_index,
-                            start_index=start_index,
-                            end_index=end_index,
-                            start_logit=result.start_logits[start_index],
-                            end_logit=result.end_logits[end_index],
-                        )
-                    )
+            # We could hypothetically create invalid predictions, e.g., predict
+            # that the start of the span is in the question. We throw out all
+            # invalid predictions.
+            starts, ends = _valid_spans(feature, start_indexes, end_indexes, max_answer_length)
+            prelim_features.append(np.full(len(starts), feature_index))
+            prelim_starts.append(starts)
+            prelim_ends.append(ends)
+            prelim_scores.append(start_logits[starts] + end_logits[ends])
         if version_2_with_negative:
-            prelim_predictions.append(
-                _PrelimPrediction(
-                    feature_index=min_null_feature_index,
-                    start_index=0,
-                    end_index=0,
-                    start_logit=null_start_logit,
-                    end_logit=null_end_logit,
-                )
-            )
-        prelim_predictions = sorted(
-            prelim_predictions,
-            key=lambda x: (x.start_logit + x.end_logit),
-            reverse=True,
+            prelim_features.append(np.array([min_null_feature_index]))
+            prelim_starts.append(np.array([0]))
+            prelim_ends.append(np.array([0]))
+            prelim_scores.append(np.array([null_start_logit + null_end_logit]))
+        prelim_features, prelim_starts, prelim_ends, prelim_scores = (
+            np.concatenate(o) if o else np.zeros(0, dtype=np.int64)
+            for o in (prelim_features, prelim_starts, prelim_ends, prelim_scores)
         )
+        null_prediction = len(prelim_scores) - 1 if version_2_with_negative else None
+
+        def _prelim_predictions():
+            # Highest scoring first, and in the order they were found otherwise
+            for i in np.argsort(-prelim_scores, kind="stable").tolist():
+                if i == null_prediction:
+                    yield _PrelimPrediction(
+                        feature_index=min_null_feature_index,
+                        start_index=0,
+                        end_index=0,
+                        start_logit=null_start_logit,
+                        end_logit=null_end_logit,
+                    )
+                    continue
+                result = unique_id_to_result[features[prelim_features[i]].unique_id]
+                start_index, end_index = int(prelim_starts[i]), int(prelim_ends[i])
+                yield _PrelimPrediction(
+                    feature_index=int(prelim_features[i]),
+                    start_index=start_index,
+                    end_index=end_index,
+                    start_logit=result.start_logits[start_index],
+                    end_logit=result.end_logits[end_index],
+                )
 
         _NbestPrediction = collections.namedtuple(  # pylint: disable=invalid-name
             "NbestPrediction",
@@ -575,7 +611,7 @@ def compute_predictions_logits(
 
         seen_predictions = {}
         nbest = []
-        for pred in prelim_predictions:
+        for pred in _prelim_predictions():
             if len(nbest) >= n_best_size:
                 break
             feature = features[pred.feature_index]
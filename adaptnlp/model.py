@@ -1,31 +1,58 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: nbs/03_model.ipynb (unless otherwise specified).
 
-__all__ = ['CudaCallback', 'AdaptiveModel']
+__all__ = ['InferenceEngine', 'Quantization', 'CudaCallback', 'BucketedDataLoader', 'AdaptiveModel', 'MicroBatcher',
+           'stream_predict', 'compare_models']
 
 # Cell
-from typing import Union, List
+import io, os, json, time, queue, numbers, asyncio, threading, warnings
+import inspect, hashlib, contextlib
+from typing import Union, List, Iterable, Callable, Iterator
 from pathlib import Path
 from abc import ABC, abstractmethod
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
 
 from flair.data import Sentence
 
 import torch
+import torch.multiprocessing
 from torch import nn
+import torch.nn.functional as F
 from torch.utils.data import TensorDataset, DataLoader
 
-from fastcore.basics import noop, store_attr, patch, first, ifnone
+from fastcore.basics import noop, store_attr, patch, first, ifnone, mk_class, chunked, GetAttr
 from fastcore.meta import delegates
 
-from fastai.callback.core import Callback, GatherPredsCallback
+from fastai.callback.core import Callback, GatherPredsCallback, CancelBatchException
 from fastai.callback.progress import ProgressCallback
 
 from fastai.learner import Learner
 from fastai.data.core import DataLoaders
 
-from fastai.torch_core import to_device, default_device
+from fastai.torch_core import to_device, to_detach, default_device
+
+from fastprogress.fastprogress import progress_bar
 
+import adaptnlp
 from .callback import GatherInputsCallback, SetInputsCallback
 
+# Cell
+mk_class('InferenceEngine', **{o:o.lower() for o in 'Fastai,Torch,Onnx,TorchScript'.split(',')},
+         doc="All possible engines `AdaptiveModel.get_preds` can run inference through with typo-proofing")
+
+# Cell
+#nbdev_comment _all_ = ['InferenceEngine']
+
+# Cell
+mk_class('Quantization', **{'DynamicInt8':'dynamic-int8'},
+         doc="All possible modes `AdaptiveModel.quantize` supports with typo-proofing")
+
+# Cell
+#nbdev_comment _all_ = ['Quantization']
+
 # Cell
 @patch
 def one_batch(
@@ -54,6 +81,69 @@ class CudaCallback(Callback):
     def before_batch(self): self.learn.xb,self.learn.yb = to_device(self.xb),to_device(self.yb)
     def before_fit(self): self.model.to(self.device)
 
+# Cell
+class BucketedDataLoader:
+    """
+    A `DataLoader`-like iterable over tokenized text that sorts the inputs by token length
+    and pads each batch only to its own longest sequence.
+
+    Batches come out in length order, use `restore_order` to put per-item outputs back
+    into the original order of `text`.
+    """
+    def __init__(
+        self,
+        tokenizer, # A HuggingFace tokenizer used to encode and pad `text`
+        text:List[str], # A list of texts to tokenize
+        batch_size:int=32, # The maximum number of texts in a batch
+        max_tokens:int=None, # A budget of padded tokens per batch, used instead of `batch_size` if passed
+        keys:tuple=('input_ids', 'attention_mask'), # The tokenizer outputs returned in each batch, in order
+        **tokenize_kwargs # Keyword arguments for the tokenizer, such as `max_length` or `truncation`
+    ):
+        store_attr('tokenizer,batch_size,max_tokens,keys')
+        self.encodings = tokenizer(list(text), padding=False, **tokenize_kwargs)
+        self.lengths = [len(ids) for ids in self.encodings['input_ids']]
+        self.batches = self._make_batches()
+        self.order = [i for batch in self.batches for i in batch]
+
+    def _make_batches(self) -> List[List[int]]:
+        "Groups the indices of the inputs, longest first, into batches"
+        batches, batch = [], []
+        for i in sorted(range(len(self.lengths)), key=lambda k: self.lengths[k], reverse=True):
+            if batch:
+                # The first item of a batch is always its longest
+                if self.max_tokens is not None: full = (len(batch)+1) * self.lengths[batch[0]] > self.max_tokens
+                else: full = len(batch) >= self.batch_size
+                if full:
+                    batches.append(batch)
+                    batch = []
+            batch.append(i)
+        if batch: batches.append(batch)
+        return batches
+
+    def _collate(self, idxs:List[int]) -> tuple:
+        "Pads the inputs at `idxs` to their longest sequence"
+        features = [{k:self.encodings[k][i] for k in self.keys} for i in idxs]
+        padded = self.tokenizer.pad(features, return_tensors='pt')
+        return tuple(padded[k] for k in self.keys)
+
+    def __len__(self): return len(self.batches)
+
+    def __iter__(self):
+        for batch in self.batches: yield self._collate(batch)
+
+    def one_batch(self) -> tuple:
+        "Grabs the first batch of data"
+        return self._collate(self.batches[0])
+
+    def restore_order(
+        self,
+        items:list # Per-input outputs in the order they were batched
+    ) -> list: # `items` in the original order of the texts
+        "Puts `items` back into the original order of the texts"
+        res = [None] * len(self.order)
+        for i, item in zip(self.order, items): res[i] = item
+        return res
+
 # Internal Cell
 class _NoopModel(nn.Module):
     """
@@ -76,13 +166,11 @@ class _BaseLearner:
       - `lr_find`, `fit_one_cycle`, `fit_flat_cos`, `fit_sgdr`, `fit` (not implemented)
       - `metrics`, `opt_func`, `splitter`, `wd`, `moms` (not implemented)
     """
-    __cbs = [SetInputsCallback(), GatherInputsCallback()]
-
     def __init__(self, device='cuda' if torch.cuda.is_available() else 'cpu') -> None:
         """
         Generates blank `Learner` and stores it away privately.
         """
-        self.__cbs.append(CudaCallback(device))
+        self.__cbs = [SetInputsCallback(), GatherInputsCallback(), CudaCallback(device)]
         self.__learner = Learner(self._generate_dls(), _NoopModel(), loss_func=noop, cbs=self.__cbs)
         self.__default_dls, self.__default_model = True, True
 
@@ -118,7 +206,7 @@ class _BaseLearner:
     def set_device(self, device:str='cpu'):
         if device != 'cpu' and device != 'cuda':
             raise ValueError("Device must either be `cpu` or `cuda`")
-        self.__learn.__cbs[-1].device = device
+        self.__cbs[-1].device = device
 
     def set_as_dict(self, as_dict:bool=False):
         """
@@ -135,9 +223,285 @@ class _BaseLearner:
         """
         self.__learner.model = model
 
+# Internal Cell
+_inference_mode = getattr(torch, 'inference_mode', torch.no_grad)
+
+class _InferenceState:
+    """
+    Minimal stand-in for the `Learner` attributes that inference `Callback`s read and write,
+    such as `model`, `xb`, `inputs`, and `pred`
+    """
+    def __init__(self, model): self.model = model
+
+    def run_event(self, cbs, event:str):
+        "Calls `event` on each of `cbs` that implements it"
+        for cb in cbs:
+            f = getattr(cb, event, None)
+            if f is not None: f()
+
+# Internal Cell
+class _Prefetcher(GetAttr):
+    "Iterates `dl` on a worker thread, keeping up to `queue_depth` batches prepared ahead of the model"
+    _default = 'dl'
+    def __init__(self, dl, queue_depth:int): store_attr('dl,queue_depth')
+    def __len__(self): return len(self.dl)
+
+    def __iter__(self):
+        done = object()
+        # A single worker keeps `next` calls on `dl` sequential
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            it = iter(self.dl)
+            pending = deque(executor.submit(next, it, done) for _ in range(self.queue_depth))
+            while True:
+                batch = pending.popleft().result()
+                if batch is done: return
+                pending.append(executor.submit(next, it, done))
+                yield batch
+
+# Internal Cell
+class _DecodeCallback(Callback):
+    """
+    Calls `decode` with the index, inputs and predictions of each batch. With a `queue_depth`, batches are decoded
+    on a worker thread while later batches run through the model, with at most `queue_depth` waiting to be decoded
+    """
+    def __init__(self, decode, queue_depth:int=0):
+        store_attr('decode,queue_depth')
+        self.executor = ThreadPoolExecutor(max_workers=1) if queue_depth else None
+        self.decoded = []
+
+    def after_batch(self):
+        args = (len(self.decoded), to_detach(self.learn.inputs, cpu=True), to_detach(self.learn.pred, cpu=True))
+        if self.executor is None: self.decoded.append(self.decode(*args))
+        else:
+            self.decoded.append(self.executor.submit(self.decode, *args))
+            if len(self.decoded) > self.queue_depth: self.decoded[-self.queue_depth-1].result()
+
+    def results(self) -> list:
+        "The decoded batches, in order"
+        if self.executor is None: return self.decoded
+        try: return [o.result() for o in self.decoded]
+        finally: self.executor.shutdown()
+
+# Internal Cell
+_onnx_inputs = ('input_ids', 'attention_mask', 'token_type_ids')
+
+class _PositionalWrapper(nn.Module):
+    "Calls `model` with positional `input_names` and returns its outputs as a tuple, for `torch.onnx.export` and `torch.jit.trace`"
+    def __init__(self, model:nn.Module, input_names:list):
+        super().__init__()
+        self.model, self.input_names = model, input_names
+
+    def forward(self, *args):
+        inputs = dict(zip(self.input_names, args))
+        if 'return_dict' in inspect.signature(self.model.forward).parameters: inputs['return_dict'] = True
+        return tuple(self.model(**inputs).values())
+
+class _OnnxModel:
+    """
+    Runs an exported ONNX graph through ONNX Runtime on the CPU, called like the transformers model it was exported from.
+
+    Inputs the graph was not exported with, such as `token_type_ids` for DistilBERT, are dropped
+    """
+    def __init__(self, path:Union[str, Path]):
+        try: import onnxruntime as ort
+        except ImportError: raise ImportError("Running ONNX models requires `onnxruntime`, install it with `pip install onnxruntime`")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(path), options, providers=['CPUExecutionProvider'])
+        self.input_names = [o.name for o in self.session.get_inputs()]
+        self.output_names = [o.name for o in self.session.get_outputs()]
+
+    def to(self, device): return self
+    def eval(self): return self
+
+    def __call__(self, *args, **kwargs):
+        inputs = {**dict(zip(_onnx_inputs, args)), **kwargs}
+        feed = {k:v.cpu().numpy() for k,v in inputs.items() if k in self.input_names}
+        outputs = self.session.run(self.output_names, feed)
+        return {k:torch.from_numpy(o) for k,o in zip(self.output_names, outputs)}
+
+# Internal Cell
+def _digest(v) -> str:
+    "Describes a `state_dict` value, unpacking quantized tensors and the packed params of quantized layers"
+    if isinstance(v, torch.Tensor):
+        if v.is_quantized: v = v.dequantize()
+        return f'{tuple(v.shape)}{float(v.double().sum())}'
+    if isinstance(v, (tuple, list)): return ','.join(_digest(o) for o in v)
+    # Such as the `torch.dtype` of packed params, or a missing bias
+    return str(v)
+
+def _fingerprint(model:nn.Module) -> str:
+    "A hash of the class, config, and weights of `model`, so cached artifacts are rebuilt whenever one changes"
+    h = hashlib.sha1(f'{type(model).__qualname__}{torch.__version__}'.encode())
+    if hasattr(model, 'config'): h.update(model.config.to_json_string().encode())
+    with torch.no_grad():
+        for k,v in model.state_dict().items(): h.update(f'{k}{_digest(v)}'.encode())
+    return h.hexdigest()
+
+class _TracedModel:
+    """
+    Runs `model` through TorchScript modules traced once per (batch size, sequence length) bucket, called like `model`.
+
+    Inputs are padded up to the nearest bucket and outputs are sliced back down. Traced modules are saved under
+    `adaptnlp.cache_root` so later processes load them instead of tracing again. Inputs larger than every bucket run eagerly
+    """
+    def __init__(self, model:nn.Module, batch_buckets:list, seq_buckets:list, device:torch.device):
+        self.model, self.device = model, device
+        self.batch_buckets, self.seq_buckets = sorted(batch_buckets), sorted(seq_buckets)
+        params = inspect.signature(model.forward).parameters
+        self.input_names = [o for o in _onnx_inputs if o in params]
+        self.pad_id = ifnone(getattr(getattr(model, 'config', None), 'pad_token_id', None), 0)
+        # Outputs whose second dimension follows the sequence length are sliced back to it
+        with torch.no_grad(): short, long = model(**self._dummy(1, 8)), model(**self._dummy(1, 9))
+        self.output_names = list(short.keys())
+        self.seq_outputs = [short[k].dim() > 1 and short[k].shape[1] != long[k].shape[1] for k in self.output_names]
+        self.cache_dir = Path(adaptnlp.cache_root)/'torchscript'/_fingerprint(model)/device.type
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.modules = {}
+
+    def to(self, device): return self
+    def eval(self): return self
+
+    def _dummy(self, bs:int, sl:int) -> dict:
+        "Dummy inputs of `bs` sequences of `sl` tokens"
+        return {o:torch.full((bs, sl), int(o != 'token_type_ids'), dtype=torch.long, device=self.device) for o in self.input_names}
+
+    def module(self, bs:int, sl:int):
+        "The traced module for a batch of `bs` sequences of `sl` tokens, loaded from disk or traced on first use"
+        if (bs, sl) not in self.modules:
+            path = self.cache_dir/f'{bs}x{sl}.pt'
+            if path.exists(): self.modules[(bs, sl)] = torch.jit.load(str(path), map_location=self.device)
+            else:
+                # Tracing can't record inside `torch.inference_mode`, which `get_preds` runs in
+                inference_off = torch.inference_mode(False) if hasattr(torch, 'inference_mode') else contextlib.nullcontext()
+                with inference_off, torch.no_grad():
+                    module = torch.jit.trace(_PositionalWrapper(self.model, self.input_names), tuple(self._dummy(bs, sl).values()))
+                # Write then rename, so other processes never load a partially written file
+                tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+                torch.jit.save(module, str(tmp))
+                os.replace(tmp, path)
+                self.modules[(bs, sl)] = module
+        return self.modules[(bs, sl)]
+
+    def __call__(self, *args, **kwargs):
+        inputs = {**dict(zip(_onnx_inputs, args)), **kwargs}
+        bs, sl = inputs['input_ids'].shape
+        bb = first(o for o in self.batch_buckets if o >= bs)
+        sb = first(o for o in self.seq_buckets if o >= sl)
+        inputs = {o:inputs.get(o, torch.zeros_like(inputs['input_ids'])) for o in self.input_names}
+        if bb is None or sb is None: return self.model(**inputs)
+        padded = [F.pad(v, (0, sb-sl, 0, bb-bs), value=self.pad_id if k == 'input_ids' else 0) for k,v in inputs.items()]
+        outputs = self.module(bb, sb)(*padded)
+        return {k:(o[:bs, :sl] if seq else o[:bs]) for k,o,seq in zip(self.output_names, outputs, self.seq_outputs)}
+
+# Internal Cell
+_worker_model = None
+
+def _init_worker(model, num_workers:int):
+    "Keeps the forked `model` for `_predict_shard`, and splits the host's threads between the workers"
+    global _worker_model
+    _worker_model = model
+    if isinstance(getattr(model, 'model', None), nn.Module): model.set_device('cpu')
+    torch.set_num_threads(max(1, torch.get_num_threads() // num_workers))
+
+def _predict_shard(text:list, kwargs:dict):
+    "Runs `predict` on one shard of texts in a worker process"
+    return _worker_model.predict(text, **kwargs)
+
+# Internal Cell
+def _merge_outputs(outputs:list, sizes:list):
+    "Merges the `outputs` of `predict` calls over consecutive shards of `sizes` items into what one `predict` call over all of them returns"
+    o = outputs[0]
+    if isinstance(o, torch.Tensor) and len(o) == sizes[0]: return torch.cat(outputs)
+    if isinstance(o, list) and all(len(out) == n for out, n in zip(outputs, sizes)):
+        return [item for out in outputs for item in out]
+    if isinstance(o, tuple): return tuple(_merge_outputs(list(outs), sizes) for outs in zip(*outputs))
+    if isinstance(o, dict):
+        if all(set(out.keys()) == {str(i) for i in range(n)} for out, n in zip(outputs, sizes)):
+            # Outputs keyed by the index of each item, such as question answering predictions
+            merged, offset = type(o)(), 0
+            for out, n in zip(outputs, sizes):
+                for i in range(n): merged[str(offset+i)] = out[str(i)]
+                offset += n
+            return merged
+        return type(o)((k, _merge_outputs([out[k] for out in outputs], sizes)) for k in o.keys())
+    # Anything not per item, such as the class names, is the same for every shard
+    return o
+
+# Internal Cell
+_safetensors_dtypes = {'float64':'F64', 'float32':'F32', 'float16':'F16', 'int64':'I64', 'int32':'I32', 'int16':'I16', 'int8':'I8', 'uint8':'U8', 'bool':'BOOL'}
+
+def _named_tensors(module:nn.Module) -> tuple:
+    "The parameters and buffers of `module` numpy can hold, each stored once, and the other names of tied ones"
+    tensors, aliases, names = {}, {}, {}
+    for prefix, m in module.named_modules():
+        for k, t in list(m._parameters.items()) + list(m._buffers.items()):
+            if t is None or str(t.dtype).replace('torch.', '') not in _safetensors_dtypes: continue
+            name = f'{prefix}.{k}' if prefix else k
+            if id(t) in names: aliases[name] = names[id(t)]
+            else: names[id(t)], tensors[name] = name, t
+    return tensors, aliases
+
+def _save_safetensors(tensors:dict, aliases:dict, path:Path):
+    "Atomically writes `tensors` to `path` in the safetensors layout, with `aliases` as its metadata"
+    arrays = {k:v.detach().cpu().contiguous().numpy() for k,v in tensors.items()}
+    header, offset = {'__metadata__':aliases}, 0
+    # Widest types first, so every tensor starts on a multiple of its element size
+    for k in sorted(arrays, key=lambda k: -arrays[k].itemsize):
+        header[k] = {'dtype':_safetensors_dtypes[arrays[k].dtype.name], 'shape':list(arrays[k].shape), 'data_offsets':[offset, offset+arrays[k].nbytes]}
+        offset += arrays[k].nbytes
+    raw = json.dumps(header).encode()
+    raw += b' ' * (-(8 + len(raw)) % 8)
+    tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(len(raw).to_bytes(8, 'little'))
+        f.write(raw)
+        for k in list(header)[1:]: arrays[k].tofile(f)
+    os.replace(tmp, path)
+
+def _mmap_safetensors(path:Path) -> tuple:
+    "Maps the tensors saved at `path` read-only without copying them, along with the other names of tied ones"
+    with open(path, 'rb') as f:
+        n = int.from_bytes(f.read(8), 'little')
+        header = json.loads(f.read(n))
+    aliases = header.pop('__metadata__', {}) or {}
+    if not header: return {}, aliases
+    data = np.memmap(path, dtype=np.uint8, mode='r', offset=8+n)
+    dtypes = {v:k for k,v in _safetensors_dtypes.items()}
+    tensors = {}
+    with warnings.catch_warnings():
+        # The weights are read-only on purpose, so torch's warning about non-writable arrays is silenced
+        warnings.simplefilter('ignore', UserWarning)
+        for k, o in header.items():
+            start, end = o['data_offsets']
+            tensors[k] = torch.from_numpy(data[start:end].view(dtypes[o['dtype']]).reshape(o['shape']))
+    return tensors, aliases
+
+def _share_module_weights(module:nn.Module, tensors:dict, aliases:dict):
+    "Points the parameters and buffers of `module` at `tensors`, keeping tied weights tied"
+    params = {}
+    for prefix, m in module.named_modules():
+        for k in list(m._parameters) + list(m._buffers):
+            name = f'{prefix}.{k}' if prefix else k
+            name = aliases.get(name, name)
+            if name not in tensors: continue
+            if k in m._parameters:
+                if name not in params: params[name] = nn.Parameter(tensors[name], requires_grad=False)
+                m._parameters[k] = params[name]
+            else: m._buffers[k] = tensors[name]
+
 # Cell
 class AdaptiveModel(ABC):
-    _learn = _BaseLearner()
+    engine = InferenceEngine.Fastai
+    as_dict = False
+    queue_depth = 0
+
+    @property
+    def _learn(self) -> _BaseLearner:
+        "A `_BaseLearner` private to this instance, created on first use"
+        if '_base_learner' not in self.__dict__: self._base_learner = _BaseLearner()
+        return self._base_learner
+
     def set_model(
         self,
         model # A PyTorch model
@@ -152,6 +516,7 @@ class AdaptiveModel(ABC):
     ):
         "Sets `as_dict` in `_learn`"
         self._learn.set_as_dict(as_dict)
+        self.as_dict = as_dict
 
     def set_device(
         self,
@@ -159,19 +524,221 @@ class AdaptiveModel(ABC):
     ):
         "Sets the device for `CudaCallback` in `__learn`"
         self._learn.set_device(device)
+        self.device = torch.device(device)
 
 
+    def set_engine(
+        self,
+        engine:InferenceEngine=InferenceEngine.Fastai # An `InferenceEngine` such as 'fastai' or 'torch'
+    ):
+        "Sets which engine `get_preds` runs inference through"
+        if engine not in (InferenceEngine.Fastai, InferenceEngine.Torch, InferenceEngine.Onnx, InferenceEngine.TorchScript):
+            raise ValueError("Engine must either be `fastai`, `torch`, `onnx`, or `torchscript`")
+        if engine == InferenceEngine.Onnx and getattr(self, 'onnx_model', None) is None:
+            raise ValueError("Load an ONNX graph with `load_onnx` before using the `onnx` engine")
+        if engine == InferenceEngine.TorchScript and getattr(self, 'compiled_model', None) is None:
+            raise ValueError("Call `compile` before using the `torchscript` engine")
+        self.engine = engine
+
+    def set_pipeline(
+        self,
+        queue_depth:int=2, # How many batches are prepared ahead of, and decoded behind, the forward pass. 0 runs each stage in turn
+    ):
+        "Overlaps preparing upcoming batches and decoding finished ones on worker threads with the model's forward pass"
+        if queue_depth < 0: raise ValueError("`queue_depth` must be at least 0")
+        self.queue_depth = queue_depth
+
+    def compile(
+        self,
+        batch_buckets:list=(1,2,4,8,16,32), # Batch sizes that batches are padded up to
+        seq_buckets:list=(32,64,128,256,512), # Sequence lengths that batches are padded up to
+        warmup:bool=False, # Whether to trace or load every bucket now instead of on first use
+    ):
+        "Runs inference through TorchScript modules traced once per bucket and cached under `adaptnlp.cache_root`, and sets the engine to `torchscript`"
+        device = ifnone(getattr(self, 'device', None), default_device())
+        self.compiled_model = _TracedModel(self.model.to(device).eval(), batch_buckets, seq_buckets, device)
+        if warmup:
+            for bs in batch_buckets:
+                for sl in seq_buckets: self.compiled_model.module(bs, sl)
+        self.set_engine(InferenceEngine.TorchScript)
+
+    def export_onnx(
+        self,
+        path:Union[str, Path], # A file to save the ONNX graph to
+        opset_version:int=12, # The ONNX opset to export with
+    ) -> Path: # The file the ONNX graph was saved to
+        "Exports `self.model` to ONNX with dynamic batch and sequence axes"
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        model = self.model.cpu().eval()
+        params = inspect.signature(model.forward).parameters
+        input_names = [o for o in _onnx_inputs if o in params]
+        # A batch of 2 sequences of 16 tokens, so fixed sized dimensions can be told apart
+        dummy = {o:torch.ones(2, 16, dtype=torch.long) for o in input_names}
+        if 'token_type_ids' in dummy: dummy['token_type_ids'].zero_()
+        with torch.no_grad(): outputs = model(**dummy, return_dict=True)
+        output_names = list(outputs.keys())
+        dynamic_axes = {o:{0:'batch', 1:'sequence'} for o in input_names}
+        for name, output in outputs.items():
+            dynamic_axes[name] = {0:'batch', 1:'sequence'} if output.dim() > 1 and output.shape[1] == 16 else {0:'batch'}
+        torch.onnx.export(
+            _PositionalWrapper(model, input_names),
+            tuple(dummy.values()),
+            str(path),
+            input_names=input_names,
+            output_names=output_names,
+            dynamic_axes=dynamic_axes,
+            opset_version=opset_version,
+        )
+        return path
+
+    def load_onnx(
+        self,
+        path:Union[str, Path], # An ONNX graph saved with `export_onnx`
+    ):
+        "Loads the ONNX graph at `path` into an ONNX Runtime session and sets the engine to `onnx`"
+        self.onnx_model = _OnnxModel(path)
+        self.set_engine(InferenceEngine.Onnx)
+
+    def quantize(
+        self,
+        mode:Quantization=Quantization.DynamicInt8 # A `Quantization` mode, such as 'dynamic-int8'
+    ):
+        "Quantizes the weights of every `nn.Linear` in `self.model` to int8, moving inference to the CPU"
+        if mode != Quantization.DynamicInt8:
+            raise ValueError("Quantization mode must be `dynamic-int8`")
+        model = torch.quantization.quantize_dynamic(self.model.cpu().eval(), {nn.Linear}, dtype=torch.qint8, inplace=True)
+        self.set_model(model)
+        # Quantized kernels only run on the CPU
+        self.set_device('cpu')
+
+    def share_weights(
+        self,
+        cache_dir:Union[str, Path]=None, # Where the weight files are kept, defaults to `adaptnlp.cache_root/'shared'`
+    ):
+        """
+        Moves the weights of every model held by `self` into read-only memory-mapped files, so that all processes
+        serving the same model, such as several uvicorn workers, share one copy of them in memory. Inference runs on the CPU.
+
+        After `quantize`, the packed int8 weights of quantized layers stay private to each process, the rest are shared
+        """
+        cache_dir = Path(ifnone(cache_dir, adaptnlp.cache_root/'shared'))
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        for module in [o for o in vars(self).values() if isinstance(o, nn.Module)]:
+            module.cpu().eval()
+            path = cache_dir/f'{_fingerprint(module)}.safetensors'
+            # The first process to serve a model writes its file, the others map the same pages
+            if not path.exists(): _save_safetensors(*_named_tensors(module), path)
+            _share_module_weights(module, *_mmap_safetensors(path))
+        if isinstance(getattr(self, 'model', None), nn.Module): self.set_device('cpu')
+
     def get_preds(
         self,
         dl=None, # An iterable DataLoader or DataLoader-like object
-        cbs=[] # Optional fastai `Callbacks`
+        cbs=[], # Optional fastai `Callbacks`
+        decode=None, # Optional function called with the index, inputs and predictions of each batch, whose results are returned instead of the predictions
     ):
         """
         Get raw predictions based on `dl` with `cbs`.
 
-        For basic inference, `cbs` should include any `Callbacks` needed to do general inference
+        For basic inference, `cbs` should include any `Callbacks` needed to do general inference.
+        After `set_pipeline`, upcoming batches are prepared and finished ones passed to `decode` on worker threads
+        """
+        if self.queue_depth and dl is not None: dl = _Prefetcher(dl, self.queue_depth)
+        if decode is not None:
+            decoder = _DecodeCallback(decode, self.queue_depth)
+            cbs = list(cbs) + [decoder]
+        if self.engine == InferenceEngine.Fastai: preds, targs = self._learn.get_preds(dl=dl, cbs=cbs)
+        else: preds, targs = self._torch_get_preds(dl=dl, cbs=cbs)
+        return (decoder.results(), targs) if decode is not None else (preds, targs)
+
+    def _torch_get_preds(self, dl=None, cbs=[]):
+        """
+        Get raw predictions based on `dl` in a plain `torch` inference loop, running the model through ONNX Runtime
+        if the engine is `onnx` or through bucketed TorchScript modules if it is `torchscript`.
+
+        Only the `before_batch`, `after_pred` and `after_batch` events of `cbs` are called, and targets are not gathered
+        """
+        if dl is None: raise ValueError("`dl` should not be `None`")
+        if self.engine == InferenceEngine.Onnx: model, device = self.onnx_model, torch.device('cpu')
+        elif self.engine == InferenceEngine.TorchScript: model, device = self.compiled_model, self.compiled_model.device
+        else:
+            device = ifnone(getattr(self, 'device', None), default_device())
+            model = self.model.to(device).eval()
+        state = _InferenceState(model)
+        cbs = sorted(cbs, key=lambda cb: cb.order)
+        for cb in cbs: cb.learn = state
+        # Mirrors the order of `GatherInputsCallback` and `SetInputsCallback` around `cbs`
+        before_inputs = [cb for cb in cbs if cb.order < SetInputsCallback.order]
+        after_inputs = [cb for cb in cbs if cb.order >= SetInputsCallback.order]
+        preds = []
+        with _inference_mode():
+            for xb in dl:
+                state.xb = to_device(tuple(xb), device)
+                state.inputs = {
+                    "input_ids":state.xb[0],
+                    "attention_mask":state.xb[1]
+                }
+                if len(state.xb) > 2: state.inputs["token_type_ids"] = state.xb[2]
+                try:
+                    state.run_event(before_inputs, 'before_batch')
+                    state.xb = state.inputs if self.as_dict else list(state.inputs.values())
+                    state.run_event(after_inputs, 'before_batch')
+                    state.pred = state.model(*state.xb)
+                    state.run_event(cbs, 'after_pred')
+                except CancelBatchException: pass
+                preds.append(to_detach(state.pred))
+                state.run_event(cbs, 'after_batch')
+        return preds, None
+
+    def predict_parallel(
+        self,
+        text:List[str], # Texts to run inference on
+        num_workers:int=2, # How many worker processes to split `text` between
+        shard_size:int=1024, # How many texts each worker passes to `predict` at a time
+        max_retries:int=2, # How many times a failing shard is retried before its error is raised
+        display:bool=True, # Whether to show a progress bar over the shards
+        **kwargs, # Keyword arguments for `predict`, such as `mini_batch_size`
+    ):
+        """
+        Runs `predict` over shards of `text` in `num_workers` forked CPU processes that share the model's weights,
+        and merges the results back into what a single `predict` call over `text` returns.
+        A model on another device is moved to the CPU while the workers run, and moved back afterwards
         """
-        return self._learn.get_preds(dl=dl, cbs=cbs)
+        text = [text] if isinstance(text, str) else list(text)
+        shards = [text[i:i+shard_size] for i in range(0, len(text), shard_size)]
+        if not shards: return self.predict(text, **kwargs)
+        model = getattr(self, 'model', None)
+        device = None
+        # Forked workers read the weights from shared memory instead of copying them
+        if isinstance(model, nn.Module):
+            device = next(model.parameters(), torch.empty(0)).device
+            model.cpu().share_memory()
+        try:
+            ctx = torch.multiprocessing.get_context('fork')
+            results, attempts = {}, defaultdict(int)
+            pbar = progress_bar(range(len(shards)), display=display)
+            pbar.update(0)
+            while len(results) < len(shards):
+                # A crashed worker breaks the whole pool, so a new pool is started for the shards left
+                with ProcessPoolExecutor(num_workers, mp_context=ctx, initializer=_init_worker, initargs=(self, num_workers)) as pool:
+                    futures = {pool.submit(_predict_shard, shards[i], kwargs):i for i in range(len(shards)) if i not in results}
+                    while futures:
+                        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            i = futures.pop(future)
+                            try: results[i] = future.result()
+                            except Exception as e:
+                                attempts[i] += 1
+                                if attempts[i] > max_retries:
+                                    for f in futures: f.cancel()
+                                    raise
+                                warnings.warn(f"Shard {i} failed with {e!r}, retrying")
+                                if not isinstance(e, BrokenProcessPool): futures[pool.submit(_predict_shard, shards[i], kwargs)] = i
+                            else: pbar.update(len(results))
+        finally:
+            if device is not None: model.to(device)
+        return _merge_outputs([results[i] for i in range(len(shards))], [len(o) for o in shards])
 
     @abstractmethod
     def load(
@@ -189,4 +756,175 @@ class AdaptiveModel(ABC):
         **kwargs,
     ) -> List[Sentence]: # A list of predicted sentences
         "Run inference on the model"
-        raise NotImplementedError("Please Implement this method")
\ No newline at end of file
+        raise NotImplementedError("Please Implement this method")
+
+# Internal Cell
+def _split_outputs(outputs, n:int) -> list:
+    "Splits the `outputs` of a `predict` call over `n` items into what `predict` returns for each single item"
+    if isinstance(outputs, (list, torch.Tensor)) and len(outputs) == n:
+        return [outputs[i:i+1] for i in range(n)]
+    if isinstance(outputs, tuple):
+        return [tuple(o) for o in zip(*[_split_outputs(o, n) for o in outputs])]
+    if isinstance(outputs, dict):
+        if set(outputs.keys()) == {str(i) for i in range(n)}:
+            # Outputs keyed by the index of each item, such as question answering predictions
+            return [type(outputs)({'0':outputs[str(i)]}) for i in range(n)]
+        splits = {k:_split_outputs(v, n) for k,v in outputs.items()}
+        return [type(outputs)((k,v[i]) for k,v in splits.items()) for i in range(n)]
+    return [outputs] * n
+
+# Cell
+class MicroBatcher:
+    """
+    Wraps an `AdaptiveModel` so that single-item `predict` calls from many threads or asyncio tasks
+    are coalesced into one batched `predict` call, bounded by `max_batch_size` and `max_wait`.
+
+    Each caller gets back what `model.predict` returns for their single item
+    """
+    def __init__(
+        self,
+        model:AdaptiveModel, # An `AdaptiveModel` to run inference with
+        max_batch_size:int=32, # The most items coalesced into one `predict` call
+        max_wait:float=0.005, # The most seconds to wait for more items once the first one arrives
+        max_queue_size:int=0, # The most items waiting to be predicted on before `submit` raises `queue.Full`. Unbounded if 0
+        **predict_kwargs # Keyword arguments passed to every `model.predict` call, such as `detail_level`
+    ):
+        store_attr('model,max_batch_size,max_wait')
+        self.predict_kwargs = predict_kwargs
+        self._queue = queue.Queue(max_queue_size)
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(
+        self,
+        predict_kwargs:dict=None, # Extra keyword arguments for `model.predict`, items are only batched with items sharing them
+        **inputs # A single item to predict on, such as `text` or `query` and `context`
+    ) -> Future: # A `Future` holding the prediction for `inputs`
+        "Queues `inputs` for the next batch, raising `queue.Full` if `max_queue_size` items are already waiting"
+        future = Future()
+        self._queue.put_nowait((inputs, ifnone(predict_kwargs, {}), future))
+        return future
+
+    def predict(
+        self,
+        predict_kwargs:dict=None, # Extra keyword arguments for `model.predict`, items are only batched with items sharing them
+        timeout:float=None, # The most seconds to wait for the prediction before raising `TimeoutError`
+        **inputs # A single item to predict on, such as `text` or `query` and `context`
+    ):
+        "Blocks until the batch `inputs` was coalesced into has been predicted on"
+        future = self.submit(predict_kwargs, **inputs)
+        try: return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    async def apredict(
+        self,
+        predict_kwargs:dict=None, # Extra keyword arguments for `model.predict`, items are only batched with items sharing them
+        timeout:float=None, # The most seconds to wait for the prediction before raising `asyncio.TimeoutError`
+        **inputs # A single item to predict on, such as `text` or `query` and `context`
+    ):
+        "Awaits the batch `inputs` was coalesced into without blocking the event loop"
+        return await asyncio.wait_for(asyncio.wrap_future(self.submit(predict_kwargs, **inputs)), timeout)
+
+    def close(self):
+        "Predicts on any queued items and stops the worker thread"
+        self._queue.put(None)
+        self._worker.join()
+
+    def __enter__(self): return self
+    def __exit__(self, *args): self.close()
+
+    def _run(self):
+        "Collects items into batches until `close` is called"
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is None: return
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0: break
+                try: item = self._queue.get(timeout=timeout)
+                except queue.Empty: break
+                if item is None:
+                    # Finish this batch before stopping
+                    stop = True
+                    break
+                batch.append(item)
+            self._predict_batch(batch)
+
+    def _predict_batch(self, batch:list):
+        "Runs one `predict` call per kind of inputs and `predict_kwargs` in `batch` and scatters the results"
+        groups = defaultdict(list)
+        for inputs, predict_kwargs, future in batch:
+            # Requests that timed out or were cancelled while queued are skipped
+            if future.set_running_or_notify_cancel():
+                key = (tuple(sorted(inputs)), tuple(sorted(predict_kwargs.items())))
+                groups[key].append((inputs, future))
+        for (keys, predict_kwargs), group in groups.items():
+            batched_inputs = {k:[inputs[k] for inputs,_ in group] for k in keys}
+            predict_kwargs = {'mini_batch_size':len(group), **self.predict_kwargs, **dict(predict_kwargs)}
+            try:
+                outputs = self.model.predict(**batched_inputs, **predict_kwargs)
+                for (_, future), output in zip(group, _split_outputs(outputs, len(group))):
+                    future.set_result(output)
+            except Exception as e:
+                for _, future in group: future.set_exception(e)
+
+# Cell
+def stream_predict(
+    items:Iterable, # Any iterable of inputs, such as an open file or a database cursor
+    predict:Callable, # Runs inference on a list of inputs, such as `EasySequenceClassifier.tag_text`
+    chunk_size:int=256, # How many inputs are read from `items` and passed to `predict` at a time
+    prefetch:int=1, # How many chunks are predicted ahead of the one being consumed
+) -> Iterator: # What `predict` returns for each chunk, in order
+    "Lazily runs `predict` over `items` one chunk at a time, holding at most `prefetch+1` chunks in memory"
+    # A single worker keeps `predict` calls sequential, while reading `items` and consuming results overlap with them
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending = deque()
+        for chunk in chunked(items, chunk_size):
+            pending.append(executor.submit(predict, chunk))
+            if len(pending) > prefetch: yield pending.popleft().result()
+        while pending: yield pending.popleft().result()
+
+# Internal Cell
+def _model_size(model:nn.Module) -> float:
+    "The size of the serialized `state_dict` of `model` in megabytes"
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.getbuffer().nbytes / 1e6
+
+# Internal Cell
+def _discrete(o):
+    "Keeps the parts of a prediction expected to match exactly between two models, such as labels and text"
+    is_score = lambda v: isinstance(v, torch.Tensor) or (isinstance(v, numbers.Real) and not isinstance(v, numbers.Integral))
+    if isinstance(o, Sentence): return [l.value for l in o.labels]
+    if isinstance(o, dict): return {k:_discrete(v) for k,v in o.items() if not is_score(v)}
+    if isinstance(o, (list, tuple)): return [_discrete(v) for v in o if not is_score(v)]
+    if isinstance(o, (str, numbers.Integral)): return o
+    return None
+
+# Cell
+def compare_models(
+    baseline:AdaptiveModel, # A reference model, such as a full precision model
+    candidate:AdaptiveModel, # A model to compare against `baseline`, such as a quantized model
+    n_runs:int=1, # How many times to time `predict` on each model
+    **predict_kwargs # Keyword arguments for `predict`, including the sample to compare on such as `text`
+) -> dict: # The average `predict` time, size and agreement of both models
+    "Compares the speed, size and predictions of `candidate` against `baseline` on a user-supplied sample"
+    report, outputs = {}, {}
+    for name, model in (('baseline', baseline), ('candidate', candidate)):
+        # The first call warms up the model and is not timed
+        outputs[name] = model.predict(**predict_kwargs)
+        start = time.perf_counter()
+        for _ in range(n_runs): model.predict(**predict_kwargs)
+        report[f'{name}_seconds'] = (time.perf_counter() - start) / n_runs
+        report[f'{name}_mb'] = _model_size(model.model)
+    report['speedup'] = report['baseline_seconds'] / report['candidate_seconds']
+    # Scores differ slightly between models, so only labels and text have to agree
+    n = max([len(v) for v in predict_kwargs.values() if isinstance(v, list)], default=1)
+    pairs = zip(_split_outputs(outputs['baseline'], n), _split_outputs(outputs['candidate'], n))
+    report['agreement'] = sum(_discrete(a) == _discrete(b) for a,b in pairs) / n
+    return report
@@ -4,12 +4,17 @@ __all__ = ['HF_TASKS', 'FLAIR_TASKS', 'HFModelResult', 'HFModelHub', 'FLAIR_MODE
            'FlairModelHub']
 
 # Cell
-from fastcore.basics import Self, merge
+import os, json, time, bisect, warnings
+from functools import partial
+from fastcore.basics import Self, merge, ifnone
+from fastcore.xtras import Path
 from fastcore.utils import dict2obj, obj2dict, mk_class
 from fastai.torch_core import apply
 from huggingface_hub.hf_api import ModelInfo, HfApi
 
-from typing import List, Dict
+from typing import List, Dict, Callable
+
+import adaptnlp
 
 # Internal Cell
 _hf_tasks = {
@@ -54,6 +59,97 @@ mk_class('FLAIR_TASKS', **_flair_tasks,
 # Cell
 #nbdev_comment _all_ = ['FLAIR_TASKS']
 
+# Internal Cell
+def _offline() -> bool:
+    "Whether the hub should never be reached, set through the `ADAPTNLP_OFFLINE` or `HF_HUB_OFFLINE` environment variables"
+    return any(os.environ.get(o, '').lower() in ('1', 'true', 'yes') for o in ('ADAPTNLP_OFFLINE', 'HF_HUB_OFFLINE'))
+
+# Internal Cell
+class _HubIndex:
+    """
+    The name, tags and task of every model `fetch` lists from the hub, kept in `adaptnlp.cache_root/'hub'/{key}.json`
+    and fetched again once older than `ttl` seconds unless offline. Models are indexed in memory by exact name and task,
+    and names are searched by substring over one joined string rather than model by model
+    """
+    def __init__(self, key:str, fetch:Callable, ttl:float, offline:bool=None):
+        self.path = adaptnlp.cache_root/'hub'/f'{key}.json'
+        self.fetch, self.ttl, self.offline = fetch, ttl, ifnone(offline, _offline())
+        cached = json.loads(self.path.read_text()) if self.path.exists() else None
+        if cached is not None and (self.offline or not self._expired(cached['fetched'])): self._build(**cached)
+        elif self.offline:
+            warnings.warn(f'Offline with no cached index at {self.path}, so no hub models can be found')
+            self._build(0, [])
+        else:
+            try: self.refresh()
+            except Exception as e:
+                if cached is None: raise
+                warnings.warn(f'Could not refresh the hub index ({e!r}), using the cached one at {self.path}')
+                self._build(**cached)
+
+    def _expired(self, fetched:float) -> bool: return time.time() - fetched >= self.ttl
+
+    @property
+    def expired(self) -> bool:
+        "Whether the index should be fetched again"
+        return not self.offline and self._expired(self.fetched)
+
+    def refresh(self):
+        "Fetches the index from the hub now and saves it"
+        cached = {'fetched':time.time(),
+                  'models':[{'modelId':m.modelId, 'tags':list(m.tags or []), 'pipeline_tag':m.pipeline_tag} for m in self.fetch()]}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Written aside and moved into place, so other processes never read half an index
+        tmp = self.path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp.write_text(json.dumps(cached))
+        os.replace(tmp, self.path)
+        self._build(**cached)
+
+    def _build(self, fetched:float, models:list):
+        "Builds the in-memory indices over `models`"
+        self.fetched = fetched
+        self.models = [ModelInfo(**m) for m in models]
+        self._by_name = {m.modelId:m for m in self.models}
+        self._by_task = {}
+        for m in self.models:
+            for tag in dict.fromkeys([m.pipeline_tag, *m.tags]):
+                if tag is not None: self._by_task.setdefault(tag, []).append(m)
+        # Names joined by a separator no name contains, with where each one starts
+        self._names = '\n'.join(m.modelId for m in self.models)
+        self._starts = []
+        start = 0
+        for m in self.models:
+            self._starts.append(start)
+            start += len(m.modelId) + 1
+
+    def get(self, name:str) -> ModelInfo:
+        "The model named exactly `name`, if any"
+        return self._by_name.get(name)
+
+    def search_name(self, name:str) -> List[ModelInfo]:
+        "Every model whose name contains `name`, in the order the hub listed them"
+        if not name: return list(self.models)
+        found, pos = [], self._names.find(name)
+        while pos >= 0:
+            i = bisect.bisect_right(self._starts, pos) - 1
+            found.append(self.models[i])
+            # Continue from the next name, so each model is only found once
+            pos = self._names.find(name, self._starts[i] + len(self.models[i].modelId) + 1)
+        return found
+
+    def search_task(self, task:str) -> List[ModelInfo]:
+        "Every model whose task or tags include `task`"
+        return list(self._by_task.get(task, []))
+
+_hub_indices = {}
+
+def _hub_index(key:str, fetch:Callable, ttl:float, offline:bool=None) -> _HubIndex:
+    "The `_HubIndex` for `key`, shared by every hub in this process until it expires"
+    index = _hub_indices.get(key)
+    offline = ifnone(offline, _offline())
+    if index is None or index.ttl != ttl or index.offline != offline or index.expired:
+        index = _hub_indices[key] = _HubIndex(key, fetch, ttl, offline)
+    return index
+
 # Cell
 class HFModelResult:
     """
@@ -102,14 +198,26 @@ class HFModelHub:
     def __init__(
         self,
         username:str=None, # Your HuggingFace username
-        password:str=None # Your HuggingFace password
+        password:str=None, # Your HuggingFace password
+        ttl:float=86400, # Seconds before the cached index of hub models is fetched again
+        offline:bool=None # Whether to only search the cached index, defaults to the `ADAPTNLP_OFFLINE` environment variable
     ):
         self.api = HfApi()
+        self.ttl, self.offline = ttl, offline
         if username and password:
             self.token = self.api.login(username, password)
         elif username or password:
             print('Only a username or password was entered. You should include both to get authorized access')
 
+    @property
+    def index(self) -> _HubIndex:
+        "The name, tags and task of every model on the hub, cached under `adaptnlp.cache_root`"
+        return _hub_index('hf', self.api.list_models, self.ttl, self.offline)
+
+    def refresh(self):
+        "Fetches the index of hub models again, regardless of its age"
+        self.index.refresh()
+
     def _format_results(
         self,
         results:list, # A list of HuggingFace API results
@@ -137,7 +245,7 @@ class HFModelHub:
 
             Please choose a valid one available from HuggingFace: (https://huggingface.co/transformers/task_summary.html)
             Or with the `HF_TASKS` object''')
-        models = self.api.list_models(task)
+        models = self.index.search_task(task)
         return self._format_results(models, as_dict, user_uploaded)
 
     def search_model_by_name(
@@ -147,15 +255,8 @@ class HFModelHub:
         user_uploaded:bool=False # Whether to filter out user-uploaded results
     ) -> (List[HFModelResult], Dict[str, HFModelResult]): # A list of `HFModelResult`s
         "Searches HuggingFace Model API for all pretrained models containing `name`"
-        if user_uploaded:
-            models = self.api.list_models()
-            models = self._format_results(models, as_dict, user_uploaded)
-            models = [m for m in models if name in m.name]
-
-        else:
-            models = self.api.list_models(name)
-            models = self._format_results(models, as_dict, user_uploaded)
-        return models
+        models = self.index.search_name(name)
+        return self._format_results(models, as_dict, user_uploaded)
 
 # Internal Cell
 # Flair models originating from:
@@ -393,14 +494,28 @@ class FlairModelHub:
     def __init__(
         self,
         username:str=None, # HuggingFace username
-        password:str=None # HuggingFace password
+        password:str=None, # HuggingFace password
+        ttl:float=86400, # Seconds before the cached index of hub models is fetched again
+        offline:bool=None # Whether to only search the cached index, defaults to the `ADAPTNLP_OFFLINE` environment variable
     ):
         self.api = HfApi()
+        self.ttl, self.offline = ttl, offline
         if username and password:
             self.token = self.api.login(username, password)
         elif username or password:
             print('Only a username or password was entered. You should include both to get authorized access')
-        self.models = self.api.list_models('flair') + FLAIR_MODELS
+
+    @property
+    def index(self) -> _HubIndex:
+        "The name, tags and task of every flair model on the hub, cached under `adaptnlp.cache_root`"
+        return _hub_index('flair', partial(self.api.list_models, 'flair'), self.ttl, self.offline)
+
+    @property
+    def models(self) -> List[ModelInfo]: return self.index.models + FLAIR_MODELS
+
+    def refresh(self):
+        "Fetches the index of flair models again, regardless of its age"
+        self.index.refresh()
 
     def _format_results(
         self,
@@ -424,7 +539,7 @@ class FlairModelHub:
         user_uploaded:bool=False # Whether to filter out user-uploaded results
     ) -> (List[FlairModelResult], Dict[str, FlairModelResult]): # A list of `FlairModelResult`s
         "Searches HuggingFace Model API for all flair models containing `name`"
-        models = [m for m in self.models if name in m.modelId]
+        models = self.index.search_name(name) + [m for m in FLAIR_MODELS if name in m.modelId]
         return self._format_results(models, as_dict, user_uploaded)
 
     def search_model_by_task(
@@ -440,4 +555,97 @@ class FlairModelHub:
             Please choose a valid one available from Flair: (https://huggingface.co/flair)
             Or with the `FLAIR_TASKS` object''')
         models = [m for m in self.models if task in m.modelId or task == m.pipeline_tag]
-        return self._format_results(models, as_dict, user_uploaded)
\ No newline at end of file
+        return self._format_results(models, as_dict, user_uploaded)
+
+# Internal Cell
+class _ModelResolver:
+    """
+    Finds where a model lives and which loader loads it, looking at local directories first, then at what it found
+    before under `adaptnlp.cache_root/'hub'/'resolved.json'`, and only then searching the Flair and HuggingFace hubs.
+    Names that could not be found are remembered too, for `ttl` seconds or until either hub index is fetched again
+    """
+    def __init__(self, ttl:float=86400, offline:bool=None):
+        self.ttl, self.offline, self._cache = ttl, offline, None
+
+    @property
+    def path(self): return adaptnlp.cache_root/'hub'/'resolved.json'
+
+    def _read(self) -> dict:
+        return json.loads(self.path.read_text()) if self.path.exists() else {}
+
+    @property
+    def cache(self) -> dict:
+        "Every resolution so far, keyed by `{kind}:{name}`"
+        if self._cache is None: self._cache = self._read()
+        return self._cache
+
+    def _save(self, key:str, entry:dict):
+        "Records `entry` for `key`, merged with what other processes may have written since"
+        cache = merge(self._read(), {key:entry})
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp.write_text(json.dumps(cache))
+        os.replace(tmp, self.path)
+        self._cache = cache
+
+    def clear(self):
+        "Forgets every resolution"
+        if self.path.exists(): self.path.unlink()
+        self._cache = None
+
+    def _fetched(self) -> list:
+        "When the Flair and HuggingFace hub indices were fetched, 0 for one that was never cached"
+        return [FlairModelHub(ttl=self.ttl, offline=self.offline).index.fetched, HFModelHub(ttl=self.ttl, offline=self.offline).index.fetched]
+
+    def _candidates(self, model_name_or_path, flair:list, hf:list) -> (str, str, list):
+        "The backend, name to load, and loaders to try for `model_name_or_path`"
+        if isinstance(model_name_or_path, FlairModelResult): return 'flair', model_name_or_path.name.replace('flairNLP/', ''), flair + hf
+        if isinstance(model_name_or_path, HFModelResult): return 'hf', model_name_or_path.name, flair + hf
+        name = str(model_name_or_path)
+        if Path(name).is_dir(): return 'local', str(Path(name).resolve()), flair + hf
+        res = FlairModelHub(ttl=self.ttl, offline=self.offline).search_model_by_name(name, user_uploaded=True)
+        # The first found should always be the non-fast option
+        if len(res) > 0: return 'flair', res[0].name.replace('flairNLP/', ''), flair
+        res = HFModelHub(ttl=self.ttl, offline=self.offline).search_model_by_name(name, user_uploaded=True)
+        if len(res) > 0: return 'hf', res[0].name, hf
+        return None, None, []
+
+    def load(
+        self,
+        kind:str, # What is being loaded, such as "token-classification", so one name can resolve differently per task
+        model_name_or_path, # A model name, local path, `FlairModelResult` or `HFModelResult`
+        flair:list, # Loaders to try when the model comes from Flair
+        hf:list # Loaders to try when the model comes from HuggingFace
+    ):
+        "Loads `model_name_or_path` with the loader that worked before, or resolves it. Returns `None` if it can't be found"
+        # A `Path` has a `name` too, but it is only the last part of the path
+        name = model_name_or_path.name if isinstance(model_name_or_path, (FlairModelResult, HFModelResult)) else model_name_or_path
+        local = isinstance(name, (str, Path)) and Path(name).is_dir()
+        if local: name = str(Path(name).resolve())
+        key = f'{kind}:{name}'
+        loaders = {l.__qualname__:l for l in flair + hf}
+        entry = self.cache.get(key)
+        # A local directory always wins, even over a name that was not found before
+        if entry is not None and entry['backend'] is None and local: entry = None
+        if entry is not None and entry['backend'] is None and time.time() - entry['resolved'] < self.ttl:
+            # A name missing from these very indices is still missing, a newer index is searched again
+            if entry.get('fetched') == self._fetched(): return None
+        if entry is not None and entry['backend'] is not None and (entry['backend'] != 'local' or Path(entry['path']).is_dir()):
+            try: return loaders[entry['cls']](entry['path'])
+            # Fall through and resolve it again, such as when the model was moved
+            except Exception: pass
+        backend, path, candidates = self._candidates(model_name_or_path, flair, hf)
+        if backend is None:
+            fetched = self._fetched()
+            # Missing from an index that was never cached, such as offline on a fresh host, is not remembered
+            if 0 not in fetched: self._save(key, {'backend':None, 'path':None, 'cls':None, 'resolved':time.time(), 'fetched':fetched})
+            return None
+        for i, loader in enumerate(candidates):
+            try: model = loader(path)
+            except Exception:
+                if i == len(candidates) - 1: raise
+                continue
+            self._save(key, {'backend':backend, 'path':path, 'cls':loader.__qualname__, 'resolved':time.time()})
+            return model
+
+_resolver = _ModelResolver()
@@ -0,0 +1,45 @@
+"""
+Measures the throughput of an AdaptNLP rest service at several levels of concurrency
+"""
+import json
+import time
+import argparse
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+
+def post(url, payload):
+    "Posts `payload` to `url` and returns the status code"
+    request = urllib.request.Request(
+        url, data=payload, headers={"Content-Type": "application/json"}
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def run(url, payload, requests, concurrency):
+    "Sends `requests` posts from `concurrency` threads and returns the throughput and status codes"
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as ex:
+        codes = Counter(ex.map(lambda _: post(url, payload), range(requests)))
+    return requests / (time.perf_counter() - start), codes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("url", help="Endpoint to post to, such as http://localhost:5000/api/sequence-classifier")
+    parser.add_argument("payload", help="JSON request body")
+    parser.add_argument("--requests", type=int, default=256, help="Requests sent per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="Concurrency levels to test")
+    args = parser.parse_args()
+
+    payload = json.dumps(json.loads(args.payload)).encode()
+    for concurrency in args.concurrency:
+        throughput, codes = run(args.url, payload, args.requests, concurrency)
+        print(f"concurrency={concurrency:<4} {throughput:8.2f} requests/s  status codes: {dict(codes)}")
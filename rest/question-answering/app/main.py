@@ -1,11 +1,15 @@
 import os
+import queue
+import asyncio
 import logging
 from typing import List
+from collections import OrderedDict
 
 import adaptnlp
+from adaptnlp.inference.question_answering import QAResult
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 
 from .data_models import (
     QuestionAnsweringRequest,
@@ -32,10 +36,23 @@ _QA_MODEL = adaptnlp.EasyQuestionAnswering()
 # Get Model Configurations From ENV VARS
 _QUESTION_ANSWERING_MODEL = os.environ["QUESTION_ANSWERING_MODEL"]
 
+# Get Batching Configurations From ENV VARS
+_MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 32))
+_MAX_BATCH_WAIT = float(os.environ.get("MAX_BATCH_WAIT", 0.01))
+_MAX_QUEUE_SIZE = int(os.environ.get("MAX_QUEUE_SIZE", 256))
+_REQUEST_TIMEOUT = float(os.environ.get("REQUEST_TIMEOUT", 30))
+
+# Get Weight Sharing Configuration From ENV VARS
+_SHARE_WEIGHTS = os.environ.get("SHARE_WEIGHTS", "0") == "1"
+
+# Coalesces concurrent requests into batches on a single inference thread
+_BATCHER = None
+
 
 # Event Handling
 @app.on_event("startup")
 async def initialize_nlp_task_modules():
+    global _BATCHER
     _QA_MODEL.predict_qa(
         query="-",
         context="______________________________________________________________________________",
@@ -43,6 +60,31 @@ async def initialize_nlp_task_modules():
         mini_batch_size=1,
         model_name_or_path=_QUESTION_ANSWERING_MODEL,
     )
+    model = next(m for m in _QA_MODEL.models.values() if m)
+    if _SHARE_WEIGHTS:
+        # Every worker maps the same read-only weight file instead of holding its own copy
+        model.share_weights()
+    _BATCHER = adaptnlp.MicroBatcher(
+        model,
+        max_batch_size=_MAX_BATCH_SIZE,
+        max_wait=_MAX_BATCH_WAIT,
+        max_queue_size=_MAX_QUEUE_SIZE,
+    )
+
+
+@app.on_event("shutdown")
+async def shutdown_nlp_task_modules():
+    _BATCHER.close()
+
+
+async def _predict(predict_kwargs=None, **inputs):
+    "Queues a single request for batched inference, failing fast when the queue is full"
+    try:
+        return await _BATCHER.apredict(predict_kwargs, timeout=_REQUEST_TIMEOUT, **inputs)
+    except queue.Full:
+        raise HTTPException(status_code=429, detail="Too many requests, try again later")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Inference timed out")
 
 
 ######################
@@ -57,21 +99,21 @@ async def question_answering(qa_request: QuestionAnsweringRequest):
     query = qa_request.query
     context = qa_request.context
     top_n = qa_request.top_n
-    out = _QA_MODEL.predict_qa(
-        query=query,
-        context=context,
-        n_best_size=top_n,
-        mini_batch_size=1,
-        model_name_or_path=_QUESTION_ANSWERING_MODEL,
-        detail_level = 'medium'
+    # Each query and context pair is batched on its own, then merged back together
+    results = await asyncio.gather(
+        *[_predict({"n_best_size": top_n}, query=q, context=c) for q, c in zip(query, context)]
     )
+    examples = [e for r in results for e in r[0]]
+    top_answer = OrderedDict((str(i), r[1]["0"]) for i, r in enumerate(results))
+    top_n_answers = OrderedDict((str(i), r[2]["0"]) for i, r in enumerate(results))
+    out = QAResult(examples, top_answer, top_n_answers, top_n).to_dict('medium')
     best_answers = [o[0] for o in out['best_answers']]
     best_n_answers = []
     for query in out['queries']:
         # For each query
         best_ans = []
-        for j in range(len(out['best_answers'][0])):
-            # For n_best_size
+        for j in range(len(out['pairings'][query][0])):
+            # For each of its answers, which can be fewer than n_best_size
             ans = out['pairings'][query][0][j]
             prob = out['pairings'][query][1][j].item()
             best_ans.append({'text':ans, 'probability':prob})
@@ -1,11 +1,21 @@
 from starlette.testclient import TestClient
+from concurrent.futures import ThreadPoolExecutor
 import os
 
 os.environ["QUESTION_ANSWERING_MODEL"] = 'distilbert-base-uncased-distilled-squad'
+# Wait long enough for concurrent requests to be coalesced into one batch
+os.environ["MAX_BATCH_WAIT"] = '0.5'
 
 from app.main import app
 
 client = TestClient(app)
+
+def setup_module():
+    # Entering the client runs the startup event, which loads the model and starts its batcher
+    client.__enter__()
+
+def teardown_module():
+    client.__exit__(None, None, None)
     
 def test_home():
     response = client.get('/')
@@ -19,5 +29,29 @@ def test_qa():
 )
     assert response.status_code == 200
     assert response.json()['best_answer'] == ['2018']
-    
+
+def test_qa_concurrent():
+    context = "Released in 2018, AdaptNLP was at the forefront of simplistic inference API with Transformers and Flair"
+    queries = ["When did AdaptNLP release?", "What was AdaptNLP at the forefront of?", "What does AdaptNLP use?"]
+    def post(query):
+        response = client.post(
+            '/api/question-answering',
+            json={"query": query, "context": [context]*len(query), "top_n":"5"},
+            headers={"Content-Type":"application/json"}
+        )
+        assert response.status_code == 200
+        return response.json()
+    def texts(o): return [[a['text'] for a in answers] for answers in o['best_n_answers']]
+    expected = [post([q]) for q in queries]
+    # Concurrent requests are batched together, and so are the pairs of a single request
+    with ThreadPoolExecutor(len(queries)) as ex:
+        responses = list(ex.map(lambda q: post([q]), queries))
+    assert [o['best_answer'] for o in responses] == [o['best_answer'] for o in expected]
+    assert [texts(o) for o in responses] == [texts(o) for o in expected]
+    response = post(queries)
+    assert response['best_answer'] == [o['best_answer'][0] for o in expected]
+    assert texts(response) == [texts(o)[0] for o in expected]
+    assert expected[0]['best_answer'] == ['2018']
+
 del os.environ["QUESTION_ANSWERING_MODEL"]
+del os.environ["MAX_BATCH_WAIT"]
@@ -1,11 +1,14 @@
 import os
+import queue
+import asyncio
 import logging
 from typing import List
 
 import adaptnlp
+from adaptnlp.inference.sequence_classification import SequenceResult
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 
 from .data_models import (
     SequenceClassificationRequest,
@@ -32,13 +35,51 @@ _SEQUENCE_CLASSIFIER = adaptnlp.EasySequenceClassifier()
 # Get Model Configurations From ENV VARS
 _SEQUENCE_CLASSIFICATION_MODEL = os.environ["SEQUENCE_CLASSIFICATION_MODEL"]
 
+# Get Batching Configurations From ENV VARS
+_MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 32))
+_MAX_BATCH_WAIT = float(os.environ.get("MAX_BATCH_WAIT", 0.01))
+_MAX_QUEUE_SIZE = int(os.environ.get("MAX_QUEUE_SIZE", 256))
+_REQUEST_TIMEOUT = float(os.environ.get("REQUEST_TIMEOUT", 30))
+
+# Get Weight Sharing Configuration From ENV VARS
+_SHARE_WEIGHTS = os.environ.get("SHARE_WEIGHTS", "0") == "1"
+
+# Coalesces concurrent requests into batches on a single inference thread
+_BATCHER = None
+
 
 # Event Handling
 @app.on_event("startup")
 async def initialize_nlp_task_modules():
+    global _BATCHER
     _SEQUENCE_CLASSIFIER.tag_text(
         text="test_me", mini_batch_size=1, model_name_or_path=_SEQUENCE_CLASSIFICATION_MODEL
     )
+    model = next(m for m in _SEQUENCE_CLASSIFIER.sequence_classifiers.values() if m)
+    if _SHARE_WEIGHTS:
+        # Every worker maps the same read-only weight file instead of holding its own copy
+        model.share_weights()
+    _BATCHER = adaptnlp.MicroBatcher(
+        model,
+        max_batch_size=_MAX_BATCH_SIZE,
+        max_wait=_MAX_BATCH_WAIT,
+        max_queue_size=_MAX_QUEUE_SIZE,
+    )
+
+
+@app.on_event("shutdown")
+async def shutdown_nlp_task_modules():
+    _BATCHER.close()
+
+
+async def _predict(predict_kwargs=None, **inputs):
+    "Queues a single request for batched inference, failing fast when the queue is full"
+    try:
+        return await _BATCHER.apredict(predict_kwargs, timeout=_REQUEST_TIMEOUT, **inputs)
+    except queue.Full:
+        raise HTTPException(status_code=429, detail="Too many requests, try again later")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Inference timed out")
 
 
 ######################
@@ -56,9 +97,8 @@ async def sequence_classifier(
     sequence_classification_request: SequenceClassificationRequest,
 ):
     text = sequence_classification_request.text
-    sentences = _SEQUENCE_CLASSIFIER.tag_text(
-        text=text, mini_batch_size=1, model_name_or_path=_SEQUENCE_CLASSIFICATION_MODEL,detail_level="low"
-    )
+    sentences = await _predict(text=text)
+    sentences = SequenceResult(sentences).to_dict("low")
     response = []
     curr_d = {}
     for i in range(len(sentences["sentences"])):
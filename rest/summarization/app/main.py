@@ -1,11 +1,13 @@
 import os
+import queue
+import asyncio
 import logging
 from typing import List
 
 import adaptnlp
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 
 from .data_models import (
     SummarizationRequest,
@@ -32,10 +34,23 @@ _SUMMARIZER = adaptnlp.EasySummarizer()
 # Get Model Configurations From ENV VARS
 _SUMMARIZATION_MODEL = os.environ["SUMMARIZATION_MODEL"]
 
+# Get Batching Configurations From ENV VARS
+_MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 32))
+_MAX_BATCH_WAIT = float(os.environ.get("MAX_BATCH_WAIT", 0.01))
+_MAX_QUEUE_SIZE = int(os.environ.get("MAX_QUEUE_SIZE", 256))
+_REQUEST_TIMEOUT = float(os.environ.get("REQUEST_TIMEOUT", 30))
+
+# Get Weight Sharing Configuration From ENV VARS
+_SHARE_WEIGHTS = os.environ.get("SHARE_WEIGHTS", "0") == "1"
+
+# Coalesces concurrent requests into batches on a single inference thread
+_BATCHER = None
+
 
 # Event Handling
 @app.on_event("startup")
 async def initialize_nlp_task_modules():
+    global _BATCHER
     _SUMMARIZER.summarize(
         text="",
         mini_batch_size=1,
@@ -45,6 +60,31 @@ async def initialize_nlp_task_modules():
         num_beams=4,
         early_stopping=True,
     )
+    model = next(m for m in _SUMMARIZER.summarizers.values() if m)
+    if _SHARE_WEIGHTS:
+        # Every worker maps the same read-only weight file instead of holding its own copy
+        model.share_weights()
+    _BATCHER = adaptnlp.MicroBatcher(
+        model,
+        max_batch_size=_MAX_BATCH_SIZE,
+        max_wait=_MAX_BATCH_WAIT,
+        max_queue_size=_MAX_QUEUE_SIZE,
+    )
+
+
+@app.on_event("shutdown")
+async def shutdown_nlp_task_modules():
+    _BATCHER.close()
+
+
+async def _predict(predict_kwargs=None, **inputs):
+    "Queues a single request for batched inference, failing fast when the queue is full"
+    try:
+        return await _BATCHER.apredict(predict_kwargs, timeout=_REQUEST_TIMEOUT, **inputs)
+    except queue.Full:
+        raise HTTPException(status_code=429, detail="Too many requests, try again later")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Inference timed out")
 
 ######################
 ### AdaptNLP API ###
@@ -62,15 +102,13 @@ async def translator(
     min_length = summarizer_request.min_length
     max_length = summarizer_request.max_length
 
-    summaries = _SUMMARIZER.summarize(
-        text=text,
-        mini_batch_size=1,
-        model_name_or_path=_SUMMARIZATION_MODEL,
-        min_length=min_length,
-        max_length=max_length,
-        num_beams=4,
+    results = await asyncio.gather(
+        *[
+            _predict({"min_length": min_length, "max_length": max_length, "num_beams": 4}, text=t)
+            for t in text
+        ]
     )
-    payload = {"text": summaries["summaries"]}
+    payload = {"text": [s for r in results for s in r["summaries"]]}
     return payload
 
 
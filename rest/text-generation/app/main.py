@@ -1,11 +1,13 @@
 import os
+import queue
+import asyncio
 import logging
 from typing import List
 
 import adaptnlp
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 
 from .data_models import (
     TextGenerationRequest,
@@ -32,16 +34,54 @@ _TEXT_GENERATOR = adaptnlp.EasyTextGenerator()
 # Get Model Configurations From ENV VARS
 _TEXT_GENERATION_MODEL = os.environ["TEXT_GENERATION_MODEL"]
 
+# Get Batching Configurations From ENV VARS
+_MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 32))
+_MAX_BATCH_WAIT = float(os.environ.get("MAX_BATCH_WAIT", 0.01))
+_MAX_QUEUE_SIZE = int(os.environ.get("MAX_QUEUE_SIZE", 256))
+_REQUEST_TIMEOUT = float(os.environ.get("REQUEST_TIMEOUT", 30))
+
+# Get Weight Sharing Configuration From ENV VARS
+_SHARE_WEIGHTS = os.environ.get("SHARE_WEIGHTS", "0") == "1"
+
+# Coalesces concurrent requests into batches on a single inference thread
+_BATCHER = None
+
 
 # Event Handling
 @app.on_event("startup")
 async def initialize_nlp_task_modules():
+    global _BATCHER
     _TEXT_GENERATOR.generate(
         text="test",
         mini_batch_size=1,
         model_name_or_path=_TEXT_GENERATION_MODEL,
         num_tokens_to_produce=50,
     )
+    model = next(m for m in _TEXT_GENERATOR.generators.values() if m)
+    if _SHARE_WEIGHTS:
+        # Every worker maps the same read-only weight file instead of holding its own copy
+        model.share_weights()
+    _BATCHER = adaptnlp.MicroBatcher(
+        model,
+        max_batch_size=_MAX_BATCH_SIZE,
+        max_wait=_MAX_BATCH_WAIT,
+        max_queue_size=_MAX_QUEUE_SIZE,
+    )
+
+
+@app.on_event("shutdown")
+async def shutdown_nlp_task_modules():
+    _BATCHER.close()
+
+
+async def _predict(predict_kwargs=None, **inputs):
+    "Queues a single request for batched inference, failing fast when the queue is full"
+    try:
+        return await _BATCHER.apredict(predict_kwargs, timeout=_REQUEST_TIMEOUT, **inputs)
+    except queue.Full:
+        raise HTTPException(status_code=429, detail="Too many requests, try again later")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Inference timed out")
 
 
 ######################
@@ -59,11 +99,8 @@ async def translator(
     text = text_generator_request.text
     num_tokens_to_produce = text_generator_request.num_tokens_to_produce
 
-    generated_text = _TEXT_GENERATOR.generate(
-        text=text,
-        mini_batch_size=1,
-        model_name_or_path=_TEXT_GENERATION_MODEL,
-        num_tokens_to_produce=num_tokens_to_produce,
+    generated_text = await _predict(
+        {"num_tokens_to_produce": num_tokens_to_produce}, text=text
     )
     payload = {"text": generated_text['generated_text']}
     return payload
@@ -1,11 +1,13 @@
 import os
+import queue
+import asyncio
 import logging
 from typing import List
 
 import adaptnlp
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 
 from .data_models import (
     TokenTaggingRequest,
@@ -33,10 +35,48 @@ _TOKEN_TAGGER = adaptnlp.EasyTokenTagger()
 _TOKEN_TAGGING_MODE = os.environ["TOKEN_TAGGING_MODE"]
 _TOKEN_TAGGING_MODEL = os.environ["TOKEN_TAGGING_MODEL"]
 
+# Get Batching Configurations From ENV VARS
+_MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 32))
+_MAX_BATCH_WAIT = float(os.environ.get("MAX_BATCH_WAIT", 0.01))
+_MAX_QUEUE_SIZE = int(os.environ.get("MAX_QUEUE_SIZE", 256))
+_REQUEST_TIMEOUT = float(os.environ.get("REQUEST_TIMEOUT", 30))
+
+# Get Weight Sharing Configuration From ENV VARS
+_SHARE_WEIGHTS = os.environ.get("SHARE_WEIGHTS", "0") == "1"
+
+# Coalesces concurrent requests into batches on a single inference thread
+_BATCHER = None
+
 # Event Handling
 @app.on_event("startup")
 async def initialize_nlp_task_modules():
+    global _BATCHER
     _TOKEN_TAGGER.tag_text(text="", model_name_or_path=_TOKEN_TAGGING_MODEL)
+    model = next(m for m in _TOKEN_TAGGER.token_taggers.values() if m)
+    if _SHARE_WEIGHTS:
+        # Every worker maps the same read-only weight file instead of holding its own copy
+        model.share_weights()
+    _BATCHER = adaptnlp.MicroBatcher(
+        model,
+        max_batch_size=_MAX_BATCH_SIZE,
+        max_wait=_MAX_BATCH_WAIT,
+        max_queue_size=_MAX_QUEUE_SIZE,
+    )
+
+
+@app.on_event("shutdown")
+async def shutdown_nlp_task_modules():
+    _BATCHER.close()
+
+
+async def _predict(predict_kwargs=None, **inputs):
+    "Queues a single request for batched inference, failing fast when the queue is full"
+    try:
+        return await _BATCHER.apredict(predict_kwargs, timeout=_REQUEST_TIMEOUT, **inputs)
+    except queue.Full:
+        raise HTTPException(status_code=429, detail="Too many requests, try again later")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Inference timed out")
 
 
 ######################
@@ -50,9 +90,12 @@ async def root():
 @app.post("/api/token_tagger", response_model=List[TokenTaggingResponse])
 async def token_tagger(token_tagging_request: TokenTaggingRequest):
     text = token_tagging_request.text
-    sentences = _TOKEN_TAGGER.tag_text(
-        text=text, model_name_or_path=_TOKEN_TAGGING_MODEL, mini_batch_size=32
-    )
+    results = await asyncio.gather(*[_predict(text=t) for t in text])
+    if results and isinstance(results[0], dict):
+        # Transformers taggers return a dictionary of results
+        sentences = {k: [o for r in results for o in r[k]] for k in results[0]}
+    else:
+        sentences = [s for r in results for s in r]
 
     # Check if transformers model return type
     if len(sentences) > 0 and isinstance(sentences[0], List):
@@ -6,6 +6,13 @@ from app.main import app
 
 
 client = TestClient(app)
+
+def setup_module():
+    # Entering the client runs the startup event, which loads the model and starts its batcher
+    client.__enter__()
+
+def teardown_module():
+    client.__exit__(None, None, None)
     
 def test_home():
     response = client.get('/')